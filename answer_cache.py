@@ -0,0 +1,238 @@
+"""
+Answer cache shared by all sessions: exact and near-duplicate questions about the same document
+"""
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import config
+from storage import connect_sqlite
+
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# "t" is what normalize_question leaves of "n't"
+NEGATION_WORDS = {"no", "not", "never", "none", "nothing", "nor", "neither", "without", "cannot", "t"}
+# Short words that are not identifiers like "A", "B2" or "v2" (with what is left of "'s", "'re", ...)
+COMMON_SHORT_WORDS = {
+    "an", "as", "at", "be", "by", "do", "go", "he", "if", "in", "is", "it", "me", "my", "of", "on",
+    "or", "so", "to", "up", "us", "we", "s", "ll", "re", "ve",
+}
+# Words that do not change what is being asked; question words like "why" are kept
+FILLER_WORDS = {
+    "a", "an", "the", "of", "in", "on", "to", "for", "is", "are", "was", "were", "be", "this", "that",
+    "these", "those", "it", "its", "do", "does", "did", "please", "paper", "document", "article", "study", "text",
+}
+
+
+def normalize_question(question):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+def question_ngrams(normalized, n=3):
+    """Character n-gram counts of a normalized question's content words, padded at word boundaries"""
+    padded = " {} ".format(" ".join(word for word in normalized.split() if word not in FILLER_WORDS))
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+def question_guard(normalized):
+    """Words two questions must share to match approximately: numbers, negations and short identifiers
+
+    Near-identical wording can still ask different things: "section 3" vs "section 4",
+    "does mention" vs "does not mention", "model A" vs "model B".
+    """
+    words = normalized.split()
+    return (
+        tuple(NUMBER.findall(normalized)),
+        frozenset(word for word in words if word in NEGATION_WORDS),
+        frozenset(word for word in words if len(word) <= 2 and word not in COMMON_SHORT_WORDS),
+    )
+
+
+def similarity(a, b):
+    """Cosine similarity of two n-gram Counters"""
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[gram] for gram, count in a.items() if gram in b)
+    return dot / math.sqrt(sum(c * c for c in a.values()) * sum(c * c for c in b.values()))
+
+
+class AnswerCache:
+    """Answers keyed by document hash and normalized question, stored in SQLite
+
+    Lookups first try the exact normalized question, then the most similar cached
+    question for the same document and model if its n-gram similarity reaches the
+    threshold. Questions that differ in their numbers, negations or short identifiers
+    (see question_guard) never match approximately. Each document keeps at most max_per_document answers,
+    least recently used first out; entries expire after ttl seconds.
+    """
+
+    def __init__(self, path=config.ANSWER_CACHE_DB_PATH, threshold=config.ANSWER_CACHE_SIMILARITY,
+                 ttl=config.ANSWER_CACHE_TTL_SECONDS, max_per_document=config.ANSWER_CACHE_MAX_PER_DOCUMENT,
+                 refresh=config.ANSWER_CACHE_REFRESH_SECONDS):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_per_document = max_per_document
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._conn = None
+        # (doc_hash, model) -> (loaded_at, {normalized: (ngrams, guard)}) for approximate lookups
+        self._questions = {}
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "doc_hash TEXT NOT NULL, model TEXT NOT NULL, normalized TEXT NOT NULL, "
+                "question TEXT NOT NULL, answer TEXT NOT NULL, created REAL NOT NULL, "
+                "accessed REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (doc_hash, model, normalized))"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _candidates(self, conn, doc_hash, model, now):
+        """Cached questions of one document, reloaded from disk every refresh seconds"""
+        loaded = self._questions.get((doc_hash, model))
+        if loaded is None or now - loaded[0] > self.refresh:
+            rows = conn.execute(
+                "SELECT normalized FROM answers WHERE doc_hash = ? AND model = ? AND created >= ?",
+                (doc_hash, model, now - self.ttl)
+            ).fetchall()
+            loaded = (now, {row[0]: (question_ngrams(row[0]), question_guard(row[0])) for row in rows})
+            self._questions[(doc_hash, model)] = loaded
+        return loaded[1]
+
+    def get(self, doc_hash, model, question):
+        """Return (answer, matched_question) for a question about a document, or None"""
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                match = normalized
+                row = conn.execute(
+                    "SELECT question, answer, created FROM answers WHERE doc_hash = ? AND model = ? AND normalized = ?",
+                    (doc_hash, model, normalized)
+                ).fetchone()
+                if row is None or now - row[2] > self.ttl:
+                    row = None
+                    match = self._most_similar(conn, doc_hash, model, normalized, now)
+                    if match is not None:
+                        row = conn.execute(
+                            "SELECT question, answer, created FROM answers "
+                            "WHERE doc_hash = ? AND model = ? AND normalized = ?",
+                            (doc_hash, model, match)
+                        ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                conn.execute(
+                    "UPDATE answers SET accessed = ?, hits = hits + 1 WHERE doc_hash = ? AND model = ? AND normalized = ?",
+                    (now, doc_hash, model, match)
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Answer cache read failed: {e}")
+                self.misses += 1
+                return None
+            if match == normalized:
+                self.exact_hits += 1
+            else:
+                self.similar_hits += 1
+            return row[1], row[0]
+
+    def _most_similar(self, conn, doc_hash, model, normalized, now):
+        if self.threshold >= 1:
+            return None
+        grams = question_ngrams(normalized)
+        guard = question_guard(normalized)
+        best, best_score = None, self.threshold
+        for candidate, (candidate_grams, candidate_guard) in self._candidates(conn, doc_hash, model, now).items():
+            if candidate_guard != guard:
+                continue
+            score = similarity(grams, candidate_grams)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def set(self, doc_hash, model, question, answer):
+        """Store the answer to a question about a document"""
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO answers (doc_hash, model, normalized, question, answer, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (doc_hash, model, normalized, question, answer, now, now)
+                )
+                self._evict(conn, doc_hash, model, now)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Answer cache write failed: {e}")
+                return
+            loaded = self._questions.get((doc_hash, model))
+            if loaded is not None:
+                loaded[1][normalized] = (question_ngrams(normalized), question_guard(normalized))
+
+    def _evict(self, conn, doc_hash, model, now):
+        """Drop expired answers, then the least recently used ones of this document over the limit"""
+        expired = conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,)).rowcount
+        trimmed = conn.execute(
+            "DELETE FROM answers WHERE doc_hash = ? AND model = ? AND normalized NOT IN ("
+            "SELECT normalized FROM answers WHERE doc_hash = ? AND model = ? ORDER BY accessed DESC LIMIT ?)",
+            (doc_hash, model, doc_hash, model, self.max_per_document)
+        ).rowcount
+        if expired or trimmed:
+            # Forget the in-memory question lists; they are rebuilt on the next lookup
+            self._questions.clear()
+
+    def invalidate(self, doc_hash):
+        """Remove every cached answer about a document"""
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("DELETE FROM answers WHERE doc_hash = ?", (doc_hash,))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Answer cache invalidation failed: {e}")
+            for key in [key for key in self._questions if key[0] == doc_hash]:
+                del self._questions[key]
+
+    def clear(self):
+        """Remove every cached answer"""
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("DELETE FROM answers")
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Answer cache clear failed: {e}")
+            self._questions.clear()
+
+    def stats(self):
+        """Return hit/miss counters"""
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                'exact_hits': self.exact_hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+            }
+
+
+answer_cache = AnswerCache()
@@ -6,9 +6,20 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import json
 from utils import (
-    process_document, generate_summary, answer_question, generate_questions,
-    extract_key_points, generate_insights, save_session_data, load_session_data
+    load_document, extract_key_points, evaluate_answers, analyze_document, context_coverage,
+    stream_summary, stream_answer, stream_insights, add_to_corpus, search_corpus, stream_corpus_answer,
+    challenge_questions, question_bank_ready
 )
+from answer_cache import answer_cache
+from cache import response_cache
+from corpus import corpus
+from export import SessionLog, available_compressions, available_formats
+from history import SessionHistory, challenge_items
+from documents import document_store
+from jobs import job_queue
+from tracing import tracer
+import config
+from metrics import metrics_store
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -22,23 +33,32 @@ st.set_page_config(
 
 def initialize_session_state():
     """Initialize session state variables"""
-    if 'doc_text' not in st.session_state:
-        st.session_state.doc_text = ""
+    if 'doc_hash' not in st.session_state:
+        # Only a handle: the document itself is shared by all sessions through the document store
+        st.session_state.doc_hash = None
     if 'summary' not in st.session_state:
         st.session_state.summary = ""
     if 'key_points' not in st.session_state:
         st.session_state.key_points = []
+    if 'coverage' not in st.session_state:
+        st.session_state.coverage = {}
     if 'insights' not in st.session_state:
         st.session_state.insights = ""
     if 'questions' not in st.session_state:
+        # ChallengeItems: question, the user's answer and its feedback
         st.session_state.questions = []
-    if 'user_answers' not in st.session_state:
-        st.session_state.user_answers = []
-    if 'feedback' not in st.session_state:
-        st.session_state.feedback = []
     if 'session_history' not in st.session_state:
-        st.session_state.session_history = []
+        st.session_state.session_history = SessionHistory()
+    if 'seen_questions' not in st.session_state:
+        # Question bank ids already drawn by this session
+        st.session_state.seen_questions = set()
+    if 'export_log' not in st.session_state:
+        st.session_state.export_log = SessionLog(st.session_state.session_history.session_id)
+    if 'jobs' not in st.session_state:
+        # operation -> key of the background job this session is waiting for
+        st.session_state.jobs = {}
     if 'analytics' not in st.session_state:
+        metrics_store.increment('sessions_started')
         st.session_state.analytics = {
             'documents_processed': 0,
             'questions_asked': 0,
@@ -50,8 +70,8 @@ def sidebar_analytics():
     """Display analytics in sidebar"""
     st.sidebar.markdown("## Analytics")
     
-    # Load analytics from file
-    analytics = load_session_data("analytics.json")
+    # Cached counters; no file I/O on a typical rerun
+    analytics = metrics_store.snapshot()
     
     col1, col2 = st.sidebar.columns(2)
     with col1:
@@ -64,63 +84,173 @@ def sidebar_analytics():
             uptime = datetime.now() - datetime.fromisoformat(analytics['start_time'])
             st.metric("Uptime", f"{uptime.days}d {uptime.seconds//3600}h")
 
+def current_document():
+    """The session's document, reopened from its memory-mapped files if it left the store"""
+    if st.session_state.doc_hash is None:
+        return None
+    return document_store.get(st.session_state.doc_hash)
+
+JOB_LABELS = {
+    'analysis': "Full analysis",
+    'summary': "Summary",
+    'key_points': "Key points",
+    'insights': "Insights",
+    'questions': "Challenge questions",
+}
+
+def start_job(operation, fn, *args, **params):
+    """Start an analysis of the session's document in the background, or join the same one already running"""
+    job = job_queue.submit(st.session_state.doc_hash, operation, fn, *args, **params)
+    st.session_state.jobs[operation] = job.key
+
+def apply_job_result(operation, result, document):
+    """Copy a finished analysis into the session"""
+    if operation == 'analysis':
+        st.session_state.summary = result['summary']
+        st.session_state.key_points = result['key_points']
+        st.session_state.insights = result['insights']
+        st.session_state.questions = challenge_items(result['questions'])
+        for coverage_key in ('key_points', 'insights'):
+            st.session_state.coverage[coverage_key] = context_coverage(document, 'analysis')
+    elif operation == 'summary':
+        st.session_state.summary = result
+    elif operation == 'key_points':
+        st.session_state.key_points = result
+        st.session_state.coverage['key_points'] = context_coverage(document, 'key_points')
+    elif operation == 'insights':
+        st.session_state.insights = result
+        st.session_state.coverage['insights'] = context_coverage(document, 'insights')
+    elif operation == 'questions':
+        st.session_state.questions = challenge_items(result)
+        remember_questions()
+        # Logged as plain question strings
+        result = [item.question for item in st.session_state.questions]
+    
+    parts = result if operation == 'analysis' else {operation: result}
+    for part, value in parts.items():
+        log_event(part, text=value)
+
+def collect_finished_jobs():
+    """Apply the results of this session's jobs that finished since the last run"""
+    for operation, key in list(st.session_state.jobs.items()):
+        job = job_queue.get(key)
+        if job is not None and not job.finished:
+            continue
+        del st.session_state.jobs[operation]
+        if job is None or key[0] != st.session_state.doc_hash:
+            # Forgotten, or started for a document the session has since replaced
+            continue
+        if job.status == "failed":
+            st.error(f"{JOB_LABELS[operation]} failed: {job.error}")
+            continue
+        document = current_document()
+        if document is not None:
+            apply_job_result(operation, job.result, document)
+
+@st.fragment(run_every=config.JOB_POLL_SECONDS)
+def job_progress(operation):
+    """Status of a running job, refreshed until it finishes"""
+    job = job_queue.get(st.session_state.jobs.get(operation))
+    if job is None or job.finished:
+        # A full rerun collects the result
+        st.rerun()
+    st.caption(f"{JOB_LABELS[operation]}: {job.status} ({job.elapsed():.0f}s)")
+    if job.partial:
+        st.markdown(f"<div class='feature-box'>{job.partial}</div>", unsafe_allow_html=True)
+
+def job_pending(operation):
+    """Show progress and return True while this session waits for operation"""
+    if operation not in st.session_state.jobs:
+        return False
+    job_progress(operation)
+    return True
+
+def log_event(event, **fields):
+    """Append an event to the session's export log as it happens"""
+    document = current_document()
+    if document is not None:
+        fields.setdefault('document', document.name or document.content_hash)
+    st.session_state.export_log.record(event, **fields)
+
 def export_data():
     """Export session data"""
     st.sidebar.markdown("## Export")
     
-    if st.sidebar.button("Export Session Data"):
-        export_data = {
-            'timestamp': datetime.now().isoformat(),
-            'document_text': st.session_state.doc_text[:1000] + "..." if len(st.session_state.doc_text) > 1000 else st.session_state.doc_text,
-            'summary': st.session_state.summary,
-            'key_points': st.session_state.key_points,
-            'insights': st.session_state.insights,
-            'questions': st.session_state.questions,
-            'user_answers': st.session_state.user_answers,
-            'feedback': st.session_state.feedback
-        }
-        
-        # Save to JSON
-        save_session_data(export_data, f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
-        
-        # Create CSV for questions and answers
-        if st.session_state.questions and st.session_state.user_answers:
-            qa_data = []
-            for i, (q, a, f) in enumerate(zip(st.session_state.questions, st.session_state.user_answers, st.session_state.feedback)):
-                qa_data.append({
-                    'Question': q,
-                    'User_Answer': a,
-                    'Feedback': f
-                })
-            
-            df = pd.DataFrame(qa_data)
-            csv = df.to_csv(index=False)
-            st.sidebar.download_button(
-                label="Download Q&A CSV",
-                data=csv,
-                file_name=f"qa_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
+    log = st.session_state.export_log
+    export_format = st.sidebar.selectbox("Export format", available_formats())
+    compression = st.sidebar.selectbox("Compression", available_compressions())
+    if st.sidebar.button("Export Session Data", disabled=not len(log)):
+        # Streams the log written so far into a file in the background
+        job = job_queue.submit(log.session_id, 'export', log.export,
+                               fmt=export_format, compression=compression, events=len(log))
+        st.session_state.export_job = job.key
+        st.session_state.pop('export_download', None)
+    job = job_queue.get(st.session_state.get('export_job'))
+    if job is None:
+        return
+    if not job.finished:
+        export_progress()
+    elif job.status == "failed":
+        st.sidebar.error(f"Export failed: {job.error}")
+    else:
+        st.sidebar.caption(f"Exported to {job.result}")
+        # (path, bytes) of the export prepared for download, read once instead of on every rerun
+        download = st.session_state.get('export_download')
+        if download is None or download[0] != job.result:
+            if os.path.getsize(job.result) > config.EXPORT_DOWNLOAD_MAX_BYTES or not st.sidebar.button("Prepare Download"):
+                return
+            with open(job.result, "rb") as f:
+                download = st.session_state.export_download = (job.result, f.read())
+        st.sidebar.download_button(label="Download Export", data=download[1], file_name=os.path.basename(download[0]))
+
+@st.fragment(run_every=config.JOB_POLL_SECONDS)
+def export_progress():
+    """Caption shown while the session's export runs"""
+    job = job_queue.get(st.session_state.export_job)
+    if job is None or job.finished:
+        # A full rerun shows the result
+        st.rerun()
+    st.caption(f"Exporting... ({job.elapsed():.0f}s)")
+
+def render_stream(stream):
+    """Render streamed text incrementally in a feature box and return the full text"""
+    placeholder = st.empty()
+    text = ""
+    for fragment in stream:
+        text += fragment
+        placeholder.markdown(f"<div class='feature-box'>{text}</div>", unsafe_allow_html=True)
+    return text
+
+def show_coverage(operation):
+    """Caption saying how much of the document an operation's prompt included"""
+    coverage = st.session_state.coverage.get(operation)
+    if coverage and not coverage['complete']:
+        st.caption(
+            f"Based on {coverage['fraction']:.0%} of the document "
+            f"({coverage['sentences']:,} of {coverage['total_sentences']:,} sentences from {coverage['sections']} sections)"
+        )
 
 def display_document_metrics():
     """Display document analysis metrics"""
-    if st.session_state.doc_text:
+    document = current_document()
+    if document is not None:
         col1, col2, col3, col4 = st.columns(4)
         
+        metrics = document.metrics
         with col1:
-            st.metric("Characters", len(st.session_state.doc_text))
+            st.metric("Characters", metrics.get('characters', 0))
         with col2:
-            st.metric("Words", len(st.session_state.doc_text.split()))
+            st.metric("Words", metrics.get('words', 0))
         with col3:
-            st.metric("Sentences", len(st.session_state.doc_text.split('.')))
+            st.metric("Sentences", metrics.get('sentences', 0))
         with col4:
             st.metric("Key Points", len(st.session_state.key_points))
 
 def create_analytics_charts():
     """Create analytics charts"""
-    if st.session_state.questions and st.session_state.user_answers:
+    if st.session_state.questions:
         # Question complexity analysis
-        word_counts = [len(q.split()) for q in st.session_state.questions]
+        word_counts = [len(item.question.split()) for item in st.session_state.questions]
         
         fig = px.bar(
             x=[f"Q{i+1}" for i in range(len(word_counts))],
@@ -147,6 +277,9 @@ def main():
         sidebar_analytics()
         export_data()
     
+    # Results of analyses that finished while the user was elsewhere
+    collect_finished_jobs()
+    
     # Main content area
     if feature_mode == "Document Analysis":
         document_analysis_page()
@@ -168,58 +301,73 @@ def document_analysis_page():
     )
     
     if uploaded_file:
-        with st.spinner("Processing document..."):
-            doc_text = process_document(uploaded_file)
-            st.session_state.doc_text = doc_text
-            
-            # Update analytics
-            analytics = load_session_data("analytics.json")
-            analytics['documents_processed'] = analytics.get('documents_processed', 0) + 1
-            save_session_data(analytics, "analytics.json")
+        # Reruns reuse the stored extraction instead of re-parsing the file
+        progress_bar = st.empty()
+        def show_progress(progress):
+            progress_bar.progress(
+                progress.fraction,
+                text=f"Processing document... {progress.metrics['words']:,} words read"
+            )
+        document = load_document(uploaded_file, on_progress=show_progress)
+        progress_bar.empty()
+        if document.content_hash is None:
+            st.error(document.text)
+            return
+        
+        if document.content_hash != st.session_state.doc_hash:
+            st.session_state.doc_hash = document.content_hash
+            log_event('document', text=document.page_text(0)[:1000] if document.page_offsets else "")
+        
+        if document.failed_pages:
+            pages = ", ".join(str(number + 1) for number in document.failed_pages)
+            st.warning(f"Text could not be extracted from page(s) {pages}; the rest of the document was loaded.")
         
         # Display metrics
         display_document_metrics()
         
+        # Everything at once: one structured request instead of four
+        if st.button("Run Full Analysis"):
+            start_job('analysis', analyze_document, document, strict=True)
+        job_pending('analysis')
+        
         # Generate analysis
         col1, col2 = st.columns(2)
         
         with col1:
             st.markdown("### Summary")
             if st.button("Generate Summary"):
-                with st.spinner("Generating summary..."):
-                    summary = generate_summary(doc_text)
-                    st.session_state.summary = summary
-                st.markdown(f"<div class='feature-box'>{summary}</div>", unsafe_allow_html=True)
-            elif st.session_state.summary:
+                start_job('summary', stream_summary, document, strict=True)
+            if not job_pending('summary') and st.session_state.summary:
                 st.markdown(f"<div class='feature-box'>{st.session_state.summary}</div>", unsafe_allow_html=True)
         
         with col2:
             st.markdown("### 🔍 Key Points")
             if st.button("Extract Key Points"):
-                with st.spinner("Extracting key points..."):
-                    key_points = extract_key_points(doc_text)
-                    st.session_state.key_points = key_points
-                for point in key_points:
-                    st.markdown(f"• {point}")
-            elif st.session_state.key_points:
+                start_job('key_points', extract_key_points, document, strict=True)
+            if not job_pending('key_points') and st.session_state.key_points:
                 for point in st.session_state.key_points:
                     st.markdown(f"• {point}")
+                show_coverage('key_points')
         
         # Insights section
         st.markdown("### AI Insights")
         if st.button("Generate Insights"):
-            with st.spinner("Generating insights..."):
-                insights = generate_insights(doc_text)
-                st.session_state.insights = insights
-            st.markdown(f"<div class='feature-box'>{insights}</div>", unsafe_allow_html=True)
-        elif st.session_state.insights:
+            start_job('insights', stream_insights, document, strict=True)
+        if not job_pending('insights') and st.session_state.insights:
             st.markdown(f"<div class='feature-box'>{st.session_state.insights}</div>", unsafe_allow_html=True)
+            show_coverage('insights')
 
 def interactive_qa_page():
     """Interactive Q&A page"""
     st.markdown("## Interactive Q&A")
     
-    if not st.session_state.doc_text:
+    scope = st.radio("Ask about:", ["Current document", "Document library"], horizontal=True)
+    if scope == "Document library":
+        library_qa()
+        return
+    
+    document = current_document()
+    if document is None:
         st.warning("Please upload a document first in the Document Analysis section.")
         return
     
@@ -228,89 +376,198 @@ def interactive_qa_page():
     # Question input
     question = st.text_input("Your question:", placeholder="e.g., What are the main findings?")
     
+    if st.button("Forget cached answers for this document", help="Answers are shared with everyone asking about the same file"):
+        answer_cache.invalidate(document.content_hash)
+        st.success("Cached answers cleared.")
+    
     if question:
         if st.button("Get Answer"):
-            with st.spinner("Generating answer..."):
-                answer = answer_question(st.session_state.doc_text, question)
-                
-                # Update analytics
-                analytics = load_session_data("analytics.json")
-                analytics['questions_asked'] = analytics.get('questions_asked', 0) + 1
-                save_session_data(analytics, "analytics.json")
-                
-                # Save to history
-                st.session_state.session_history.append({
-                    'timestamp': datetime.now().isoformat(),
-                    'question': question,
-                    'answer': answer
-                })
-            
             st.markdown("### Answer:")
-            st.markdown(f"<div class='feature-box'>{answer}</div>", unsafe_allow_html=True)
+            answer = render_stream(stream_answer(document, question))
+            
+            # Update analytics
+            metrics_store.increment('questions_asked')
+            
+            # Save to history
+            st.session_state.session_history.append(question, answer)
+            log_event('question', question=question, answer=answer)
     
     # Session history
     if st.session_state.session_history:
         st.markdown("###  Session History")
-        for i, entry in enumerate(reversed(st.session_state.session_history[-5:])):  # Show last 5
-            with st.expander(f"Q: {entry['question'][:50]}..."):
-                st.write(f"**Question:** {entry['question']}")
-                st.write(f"**Answer:** {entry['answer']}")
-                st.caption(f"Asked at: {entry['timestamp']}")
+        for entry in st.session_state.session_history.recent(config.SESSION_HISTORY_LIMIT):
+            with st.expander(f"Q: {entry.question[:50]}..."):
+                st.write(f"**Question:** {entry.question}")
+                st.write(f"**Answer:** {entry.answer}")
+                st.caption(f"Asked at: {entry.timestamp}")
+
+def library_qa():
+    """Questions answered from passages across every document in the library, with citations"""
+    with st.expander("Manage library"):
+        uploaded_files = st.file_uploader(
+            "Add PDF or TXT documents to the library",
+            type=["pdf", "txt"],
+            accept_multiple_files=True
+        )
+        if uploaded_files and st.button("Add to Library"):
+            add_to_corpus(uploaded_files)
+            st.success(f"Queued {len(uploaded_files)} document(s) for indexing.")
+        
+        document = current_document()
+        if document is not None and document.content_hash not in corpus:
+            if st.button("Add Current Document"):
+                corpus.submit_document(document)
+                st.success("Queued the current document for indexing.")
+        
+        pending = corpus.pending()
+        if pending:
+            st.info(f"Indexing {len(pending)} document(s): {', '.join(pending[:5])}")
+            st.button("Refresh Status")
+    
+    stats = corpus.stats()
+    st.caption(f"Library: {stats['documents']:,} documents, {stats['words']:,} words")
+    if not stats['documents']:
+        st.warning("The library is empty. Add documents under Manage library.")
+        return
+    
+    question = st.text_input("Your question:", placeholder="e.g., Which papers report results on ImageNet?")
+    
+    if question and st.button("Get Answer"):
+        passages = search_corpus(question)
+        st.markdown("### Answer:")
+        answer = render_stream(stream_corpus_answer(question, passages))
+        
+        if passages:
+            st.markdown("### Sources:")
+            for n, passage in enumerate(passages, 1):
+                with st.expander(f"[{n}] {passage['name']}, page {passage['page'] + 1}"):
+                    st.write(passage['text'])
+        
+        metrics_store.increment('questions_asked')
+        st.session_state.session_history.append(question, answer, scope="library")
+        log_event('question', document="library", question=question, answer=answer)
 
 def challenge_mode_page():
     """Challenge mode page"""
     st.markdown("##  Challenge Mode")
     
-    if not st.session_state.doc_text:
+    document = current_document()
+    if document is None:
         st.warning("Please upload a document first in the Document Analysis section.")
         return
     
-    # Generate questions if not already done
-    if not st.session_state.questions:
-        if st.button("Generate Challenge Questions"):
-            with st.spinner("Generating questions..."):
-                questions = generate_questions(st.session_state.doc_text, 5)
-                st.session_state.questions = questions
-                st.session_state.user_answers = [""] * len(questions)
-                st.session_state.feedback = [""] * len(questions)
+    # Draw questions from the document's question bank if not already done
+    if not st.session_state.questions and 'questions' not in st.session_state.jobs:
+        bank_job = job_queue.get((document.content_hash, 'question_bank', ()))
+        if question_bank_ready(document):
+            draw_questions(document)
+        elif bank_job is not None and not bank_job.finished:
+            # The pool is still being generated since ingestion: wait for it
+            start_job('questions', challenge_questions, document, num_questions=config.DEFAULT_NUM_QUESTIONS)
+        elif st.button("Generate Challenge Questions"):
+            start_job('questions', challenge_questions, document, num_questions=config.DEFAULT_NUM_QUESTIONS)
+    job_pending('questions')
     
     # Display questions and answers
     if st.session_state.questions:
         st.markdown("### Test Your Understanding")
         
-        for i, question in enumerate(st.session_state.questions):
-            st.markdown(f"**Question {i+1}:** {question}")
+        for i, item in enumerate(st.session_state.questions):
+            st.markdown(f"**Question {i+1}:** {item.question}")
             
             # Answer input
-            st.session_state.user_answers[i] = st.text_area(
+            item.answer = st.text_area(
                 f"Your answer {i+1}",
-                value=st.session_state.user_answers[i],
+                value=item.answer,
                 height=100
             )
             
             # Evaluate button
             if st.button(f"Evaluate Answer {i+1}"):
-                if st.session_state.user_answers[i].strip():
+                if item.answer.strip():
                     with st.spinner("Evaluating..."):
-                        eval_prompt = (
-                            f"Evaluate this answer based on the document.\n\n"
-                            f"Question: {question}\n"
-                            f"User Answer: {st.session_state.user_answers[i]}\n\n"
-                            f"Provide constructive feedback and a score out of 10."
-                        )
-                        feedback = answer_question(st.session_state.doc_text, eval_prompt)
-                        st.session_state.feedback[i] = feedback
-                
-                if st.session_state.feedback[i]:
-                    st.markdown("**Feedback:**")
-                    st.markdown(f"<div class='feature-box'>{st.session_state.feedback[i]}</div>", unsafe_allow_html=True)
+                        record_feedback(item, evaluate_answers(document, [item.question], [item.answer])[0])
+            
+            if item.feedback:
+                st.markdown("**Feedback:**")
+                # Markdown is not rendered inside the HTML box, so the score goes above it
+                if item.score is not None:
+                    st.markdown(f"**Score: {item.score}/10**")
+                st.markdown(f"<div class='feature-box'>{item.feedback}</div>", unsafe_allow_html=True)
+                if item.reference:
+                    with st.expander("Reference answer"):
+                        st.write(item.reference)
+                        if item.source:
+                            page = f" (page {item.source_page + 1})" if item.source_page is not None else ""
+                            st.caption(f"Source{page}: \"{item.source}\"")
+        
+        # Grade every answer in a single request
+        if st.button("Evaluate All Answers"):
+            with st.spinner("Evaluating all answers..."):
+                items = st.session_state.questions
+                results = evaluate_answers(
+                    document, [item.question for item in items], [item.answer for item in items]
+                )
+                for item, result in zip(items, results):
+                    if result is not None:
+                        record_feedback(item, result)
+            st.rerun()
+        
+        if question_bank_ready(document) and st.button("New Questions"):
+            draw_questions(document)
+            st.rerun()
+
+def draw_questions(document):
+    """Questions from the document's question bank that this session has not seen yet"""
+    st.session_state.questions = challenge_items(challenge_questions(
+        document, config.DEFAULT_NUM_QUESTIONS, exclude=st.session_state.seen_questions
+    ))
+    remember_questions()
+    log_event('questions', text=[item.question for item in st.session_state.questions])
+
+def remember_questions():
+    st.session_state.seen_questions.update(
+        item.question_id for item in st.session_state.questions if item.question_id is not None
+    )
+
+def record_feedback(item, result):
+    """Store a graded answer on its ChallengeItem and log it, score first"""
+    item.score = result['score']
+    item.feedback = result['feedback']
+    feedback = item.feedback if item.score is None else f"Score: {item.score}/10\n\n{item.feedback}"
+    log_event('feedback', question=item.question, answer=item.answer, feedback=feedback)
+
+def operation_latency_panel():
+    """Latency percentiles per traced operation, with the distribution of one of them"""
+    st.markdown("### Operation Latency")
+    rows = tracer.summary()
+    if not rows:
+        st.info("No model calls or ingestion steps traced yet.")
+        return
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    
+    operation = st.selectbox("Latency distribution for:", [row['operation'] for row in rows])
+    spans = pd.DataFrame(tracer.spans(operation))
+    spans['duration_ms'] = spans['duration_s'] * 1000
+    spans['cache'] = spans['cache'].fillna("not cached")
+    fig = px.histogram(spans, x='duration_ms', color='cache', nbins=40, title=f"{operation} latency (ms)")
+    row = next(row for row in rows if row['operation'] == operation)
+    for label in ('p50', 'p95', 'p99'):
+        fig.add_vline(x=row[f'{label}_ms'], line_dash="dash", annotation_text=label)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Download Prometheus Metrics", tracer.prometheus(), file_name="metrics.prom", mime="text/plain")
+    with col2:
+        st.download_button("Download Traces (JSON Lines)", tracer.jsonl(), file_name="traces.jsonl", mime="application/x-ndjson")
 
 def analytics_dashboard_page():
     """Analytics dashboard page"""
     st.markdown("## Analytics Dashboard")
     
     # Load analytics
-    analytics = load_session_data("analytics.json")
+    analytics = metrics_store.snapshot()
     
     # Key metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -325,16 +582,45 @@ def analytics_dashboard_page():
             uptime = datetime.now() - datetime.fromisoformat(analytics['start_time'])
             st.metric("Uptime", f"{uptime.days}d {uptime.seconds//3600}h")
     
+    # Response cache
+    cache_stats = response_cache.stats()
+    st.caption(
+        f"Response cache: {cache_stats['hits']} hits ({cache_stats['disk_hits']} from disk), "
+        f"{cache_stats['misses']} misses, {cache_stats['hit_rate']:.0%} hit rate"
+    )
+    job_stats = job_queue.stats()
+    st.caption(
+        f"Background jobs: {job_stats['running']} running, {job_stats['queued']} queued, "
+        f"{job_stats['done']} finished, {job_stats['failed']} failed"
+    )
+    answer_stats = answer_cache.stats()
+    st.caption(
+        f"Answer cache: {answer_stats['exact_hits']} exact and {answer_stats['similar_hits']} similar-question hits, "
+        f"{answer_stats['misses']} misses, {answer_stats['hit_rate']:.0%} hit rate"
+    )
+    
+    operation_latency_panel()
+    
     # Charts
     if st.session_state.questions:
         create_analytics_charts()
     
     # Session history table
-    if st.session_state.session_history:
+    history = st.session_state.session_history
+    if history:
         st.markdown("### Recent Q&A Sessions")
-        df = pd.DataFrame(st.session_state.session_history)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        st.dataframe(df[['timestamp', 'question']].tail(10))
+        summary = history.summary()
+        st.caption(
+            f"{summary['questions']} questions this session ({summary['library_questions']} about the library), "
+            f"answers average {summary['average_answer_words']:.0f} words"
+        )
+        # Only the newest entries, oldest first: a fixed-size table however long the session
+        recent = history.recent(10)[::-1]
+        df = pd.DataFrame({
+            'timestamp': pd.to_datetime([entry.timestamp for entry in recent]),
+            'question': [entry.question for entry in recent],
+        })
+        st.dataframe(df)
 
 if __name__ == "__main__":
     main()
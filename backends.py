@@ -0,0 +1,290 @@
+"""
+LLM backends: the Gemini API and a local deterministic stand-in for offline load testing
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import config
+from scheduler import RequestScheduler
+
+
+class LLMBackend:
+    """Interface used by utils for all model calls"""
+
+    name = "base"
+    model_name = ""
+
+    def generate(self, prompt, json_output=False):
+        """Return the full response text for prompt; json_output asks for a JSON-only reply"""
+        raise NotImplementedError
+
+    def stream(self, prompt):
+        """Yield response text fragments as they are produced"""
+        yield self.generate(prompt)
+
+    def batch(self, prompts, max_workers=config.SUMMARY_CONCURRENCY):
+        """Generate responses for several prompts concurrently, in order"""
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.generate, prompts))
+
+    def available(self):
+        """Cheap status query: can this backend currently serve requests?"""
+        return True
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through google.generativeai, configured lazily on first use"""
+
+    name = "gemini"
+
+    def __init__(self, model_name=config.GEMINI_MODEL, check_interval=config.API_CHECK_INTERVAL_SECONDS):
+        self.model_name = model_name
+        self.check_interval = check_interval
+        self._model = None
+        self._lock = threading.Lock()
+        self._checker_started = False
+        self.status = {'available': None, 'checked_at': None, 'error': None}
+
+    def get_api_key(self):
+        """Return the Google API key from Streamlit secrets or the environment"""
+        # Try to get API key from Streamlit secrets first (for deployment)
+        try:
+            import streamlit as st
+            google_api_key = st.secrets.get("GOOGLE_API_KEY", None)
+        except Exception:
+            google_api_key = None
+
+        # Fall back to environment variable if not in secrets
+        return google_api_key or os.getenv("GOOGLE_API_KEY")
+
+    def get_model(self):
+        """Return the Gemini model, configuring the client on first call"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    google_api_key = self.get_api_key()
+                    if not google_api_key:
+                        return None
+                    import google.generativeai as genai
+                    genai.configure(api_key=google_api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt, json_output=False):
+        generation_config = {'response_mime_type': "application/json"} if json_output else None
+        return self.get_model().generate_content(prompt, generation_config=generation_config).text
+
+    def stream(self, prompt):
+        for chunk in self.get_model().generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+    def check(self):
+        """Probe the API with a metadata lookup and record the result"""
+        try:
+            if self.get_model() is None:
+                raise RuntimeError("no Google API key configured")
+            import google.generativeai as genai
+            genai.get_model(f"models/{self.model_name}")
+            self.status.update(available=True, error=None)
+        except Exception as e:
+            print(f"Warning: Gemini API not available: {e}")
+            self.status.update(available=False, error=str(e))
+        self.status['checked_at'] = datetime.now()
+        return self.status['available']
+
+    def _check_periodically(self):
+        while True:
+            self.check()
+            time.sleep(self.check_interval)
+
+    def available(self):
+        """The first call starts the background availability check"""
+        if not self.get_api_key():
+            return False
+        if not self._checker_started:
+            with self._lock:
+                if not self._checker_started:
+                    self._checker_started = True
+                    threading.Thread(target=self._check_periodically, name="gemini-api-check", daemon=True).start()
+        # Until the first probe finishes, assume the API works since a key is configured
+        return self.status['available'] is not False
+
+
+class ScheduledBackend(LLMBackend):
+    """Wraps a backend so every request goes through the shared RequestScheduler"""
+
+    def __init__(self, backend, scheduler=None):
+        self.backend = backend
+        self.scheduler = scheduler or RequestScheduler()
+        self.name = backend.name
+        self.model_name = backend.model_name
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    @staticmethod
+    def _key(prompt, *parts):
+        return "-".join([hashlib.sha256(prompt.encode("utf-8")).hexdigest(), *parts])
+
+    def generate(self, prompt, json_output=False):
+        # Identical prompts sent at the same moment share one request
+        key = self._key(prompt, "json") if json_output else self._key(prompt)
+        return self.scheduler.run(key, self.backend.generate, prompt, json_output)
+
+    def stream(self, prompt):
+        # Identical prompts streamed at the same moment share one stream; retries cover
+        # opening it up to its first fragment
+        yield from self.scheduler.stream(self._key(prompt, "stream"), self._open_stream, self.backend.stream, prompt)
+
+    def _open_stream(self, stream, *args):
+        fragments = iter(stream(*args))
+        first = next(fragments, None)
+
+        def resumed():
+            if first is not None:
+                yield first
+            yield from fragments
+        return resumed()
+
+    def available(self):
+        return self.backend.available()
+
+
+class LocalBackendError(Exception):
+    """Simulated API error raised by LocalBackend"""
+
+    def __init__(self, code):
+        super().__init__(f"simulated error {code}")
+        self.code = code
+
+
+class LocalBackend(LLMBackend):
+    """Deterministic offline stand-in with configurable latency and throughput
+
+    Responses are built from the prompt itself: JSON requests get well-formed JSON in the
+    shape the app's prompts ask for, everything else a numbered list of sentences taken
+    from the document. The same prompt always produces the same response.
+    """
+
+    name = "local"
+
+    def __init__(self, latency=config.LOCAL_BACKEND_LATENCY, tokens_per_second=config.LOCAL_BACKEND_TOKENS_PER_SECOND,
+                 response_words=config.LOCAL_BACKEND_RESPONSE_WORDS, error_rate=config.LOCAL_BACKEND_ERROR_RATE):
+        self.model_name = "local-template"
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_words = response_words
+        self.error_rate = error_rate
+
+    def _maybe_fail(self):
+        """Raise a simulated 429 at the configured rate to exercise retries under load"""
+        if self.error_rate and random.random() < self.error_rate:
+            raise LocalBackendError(429)
+
+    def respond(self, prompt, json_output=False):
+        """The response text for prompt, without any simulated delay"""
+        if json_output:
+            return json.dumps(self._respond_json(prompt))
+
+        lines = []
+        for number, sentence in enumerate(self._sentences(prompt), 1):
+            if "questions" in prompt:
+                sentence = sentence.rstrip(".!?") + "?"
+            lines.append(f"{number}. {sentence}")
+        return "\n".join(lines)
+
+    def _sentences(self, prompt):
+        """Leading document sentences, up to about response_words words"""
+        # The document is the longest paragraph of every prompt template
+        body = re.sub(r"\s+", " ", max(prompt.split("\n\n"), key=len))
+        body = re.sub(r"^Document: ", "", body)
+        sentences = []
+        words = 0
+        for sentence in re.split(r"(?<=[.!?])\s+", body):
+            sentence = sentence.strip()[:200]
+            if len(sentence) <= 10:
+                continue
+            sentences.append(sentence)
+            words += len(sentence.split())
+            if words >= self.response_words:
+                break
+        return sentences
+
+    def _respond_json(self, prompt):
+        """JSON replies shaped like the ones the app's JSON prompts ask for"""
+        if '"number"' in prompt:
+            numbers = sorted({int(n) for n in re.findall(r"^Answer (\d+)$", prompt, re.MULTILINE)}) or [1]
+            seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+            return [
+                {'number': n, 'score': (seed >> n) % 11, 'feedback': f"Stand-in feedback for answer {n}."}
+                for n in numbers
+            ]
+        lines = self._sentences(prompt)
+        questions = [line.rstrip(".!?") + "?" for line in lines]
+        if '"source"' in prompt:
+            return [
+                {'question': question, 'answer': line, 'source': line}
+                for question, line in zip(questions, lines)
+            ]
+        if '"summary"' in prompt:
+            return {
+                'summary': " ".join(lines),
+                'key_points': lines[:7],
+                'insights': " ".join(lines[:4]),
+                'questions': questions,
+            }
+        return questions
+
+    def stream(self, prompt):
+        text = self.respond(prompt)
+        time.sleep(self.latency)
+        self._maybe_fail()
+        # Emit roughly one word per token at the configured throughput
+        for fragment in re.findall(r"\S+\s*", text):
+            if self.tokens_per_second:
+                time.sleep(1.0 / self.tokens_per_second)
+            yield fragment
+
+    def generate(self, prompt, json_output=False):
+        text = self.respond(prompt, json_output)
+        delay = self.latency
+        if self.tokens_per_second:
+            delay += len(text.split()) / self.tokens_per_second
+        time.sleep(delay)
+        self._maybe_fail()
+        return text
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'local': LocalBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide backend selected by config.LLM_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = BACKENDS[config.LLM_BACKEND]()
+                if config.SCHEDULER_ENABLED:
+                    _backend = ScheduledBackend(_backend)
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the process-wide backend (benchmarks and load tests)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
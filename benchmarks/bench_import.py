@@ -0,0 +1,58 @@
+"""
+Benchmark cold-start import time of the app modules and check that importing does no network I/O
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter: any socket connection attempt during import is recorded and refused
+CHILD = """
+import socket, sys, time
+attempts = []
+def refuse(self, address):
+    attempts.append(str(address))
+    raise OSError("network disabled during import benchmark")
+socket.socket.connect = refuse
+socket.socket.connect_ex = refuse
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, len(attempts))
+"""
+
+def measure(module, runs):
+    """Import module in `runs` fresh interpreters and return the timings and connection attempts"""
+    timings = []
+    attempts = 0
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD.format(module=module)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        elapsed, count = result.stdout.strip().splitlines()[-1].split()
+        timings.append(float(elapsed))
+        attempts += int(count)
+    return timings, attempts
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    report = {}
+    for module in ["config", "utils"]:
+        timings, attempts = measure(module, runs)
+        report[module] = {
+            'runs': runs,
+            'min_s': round(min(timings), 4),
+            'median_s': round(statistics.median(timings), 4),
+            'network_attempts': attempts,
+        }
+        print(f"import {module}: median {report[module]['median_s']:.3f}s, "
+              f"min {report[module]['min_s']:.3f}s, network attempts {attempts}")
+    print(json.dumps(report, indent=2))
+    return 0 if all(r['network_attempts'] == 0 for r in report.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Offline benchmark of document ingestion and every utils operation against the local stand-in model
+
+Synthetic TXT and PDF documents of several sizes are processed with process_document and
+then analyzed with each operation. Every measurement reports p50/p95/mean latency,
+throughput and peak traced Python memory; the report is written as JSON so two commits
+can be compared with --compare.
+
+    python benchmarks/bench_pipeline.py --runs 5 --latency 0.05
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH = tempfile.mkdtemp(prefix="bench-pipeline-")
+
+# Keep every cache and database of the run out of the working tree; set before config is imported
+os.environ.update({
+    'LLM_BACKEND': "local",
+    'CACHE_DB_PATH': os.path.join(SCRATCH, "responses.sqlite3"),
+    'ANSWER_CACHE_DB_PATH': os.path.join(SCRATCH, "answers.sqlite3"),
+    'CORPUS_DB_PATH': os.path.join(SCRATCH, "corpus.sqlite3"),
+    'METRICS_DB_PATH': os.path.join(SCRATCH, "metrics.sqlite3"),
+    'QUESTION_BANK_DB_PATH': os.path.join(SCRATCH, "questions.sqlite3"),
+    'DOCUMENT_FILES_DIR': os.path.join(SCRATCH, "documents"),
+})
+sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+import utils  # noqa: E402
+from backends import LocalBackend, ScheduledBackend, set_backend  # noqa: E402
+from documents import Document, DocumentStore  # noqa: E402
+from scheduler import RequestScheduler, TokenBucket  # noqa: E402
+from synthetic import make_pdf, make_text  # noqa: E402
+
+DOCUMENTS = {
+    'txt-20kb': ("text/plain", lambda: make_text(20 * 1024)),
+    'txt-1mb': ("text/plain", lambda: make_text(1024 * 1024, seed=1)),
+    'pdf-10p': ("application/pdf", lambda: make_pdf(10, seed=2)),
+    'pdf-120p': ("application/pdf", lambda: make_pdf(120, seed=3)),
+}
+QUESTION = "What does the evaluation say about model accuracy and latency?"
+
+
+class Upload(io.BytesIO):
+    """Stands in for Streamlit's UploadedFile"""
+
+    def __init__(self, data, name, file_type):
+        super().__init__(data)
+        self.name = name
+        self.type = file_type
+
+
+def fresh_copy(document):
+    """Same text and index as document, but none of its derived views: each run builds its own prompts"""
+    copy = Document(document.content_hash, document.text, document.page_offsets, document.name,
+                    document.failed_pages, document.metrics)
+    copy.chunk_index = document.chunk_index
+    return copy
+
+
+def operations(document):
+    """(name, callable) pairs timed for one document"""
+    questions = ["What is the main result?", "Which method is used?"]
+    answers = ["The model improves accuracy.", "A regression baseline."]
+    return [
+        ('prompt_contexts', lambda doc: [utils.context_coverage(doc, op) for op in config.CONTEXT_SECTIONS]),
+        ('generate_summary', lambda doc: utils.generate_summary(doc)),
+        ('stream_summary', lambda doc: "".join(utils.stream_summary(doc))),
+        ('answer_question', lambda doc: utils.answer_question(doc, QUESTION)),
+        ('generate_questions', lambda doc: utils.generate_questions(doc, 5)),
+        ('extract_key_points', lambda doc: utils.extract_key_points(doc)),
+        ('generate_insights', lambda doc: utils.generate_insights(doc)),
+        ('analyze_document', lambda doc: utils.analyze_document(doc)),
+        ('evaluate_answers', lambda doc: utils.evaluate_answers(doc, questions, answers)),
+    ]
+
+
+def measure(fn, make_input, runs):
+    """Time runs calls of fn(make_input()), then repeat once under tracemalloc for the memory peak"""
+    timings = []
+    for _ in range(runs):
+        argument = make_input()
+        start = time.perf_counter()
+        fn(argument)
+        timings.append(time.perf_counter() - start)
+
+    argument = make_input()
+    tracemalloc.start()
+    fn(argument)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings = np.array(timings)
+    return {
+        'runs': runs,
+        'p50_ms': round(float(np.percentile(timings, 50)) * 1000, 3),
+        'p95_ms': round(float(np.percentile(timings, 95)) * 1000, 3),
+        'mean_ms': round(float(timings.mean()) * 1000, 3),
+        'throughput_per_s': round(runs / float(timings.sum()), 3) if timings.sum() else None,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_document(name, file_type, data, runs):
+    """Benchmark ingestion and all operations on one synthetic document"""
+    results = []
+
+    def upload():
+        # A fresh store every run, so the document is really extracted and indexed again
+        utils.document_store = DocumentStore(directory=tempfile.mkdtemp(dir=SCRATCH))
+        return Upload(data, name, file_type)
+
+    result = measure(lambda upload_file: utils.process_document(upload_file), upload, runs)
+    result['megabytes_per_s'] = round(len(data) / 1e6 / (result['mean_ms'] / 1000), 3)
+    results.append(dict(result, document=name, operation='process_document'))
+
+    document = utils.load_document(upload())
+    print(f"{name}: {len(data) / 1024:.0f} KB, {len(document.page_offsets)} pages, "
+          f"{document.metrics['words']:,} words")
+    for operation, fn in operations(document):
+        result = measure(fn, lambda: fresh_copy(document), runs)
+        results.append(dict(result, document=name, operation=operation))
+    for result in results:
+        print(f"  {result['operation']:<20} p50 {result['p50_ms']:>10.1f} ms  p95 {result['p95_ms']:>10.1f} ms  "
+              f"peak {result['peak_memory_kb']:>10.0f} KB")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline_path, tolerance):
+    """Print p50 changes against an earlier report; return the number of regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(r['document'], r['operation']): r for r in baseline['results']}
+    regressions = 0
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline_path}):")
+    for setting in ('runs', 'model_latency_s', 'model_tokens_per_second', 'cpu_count'):
+        if baseline['meta'].get(setting) != report['meta'][setting]:
+            print(f"  note: {setting} differs ({baseline['meta'].get(setting)} -> {report['meta'][setting]})")
+    for result in report['results']:
+        old = before.get((result['document'], result['operation']))
+        if old is None or not old['p50_ms']:
+            continue
+        ratio = result['p50_ms'] / old['p50_ms']
+        flag = ""
+        if ratio > tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"  {result['document']:<10} {result['operation']:<20} {old['p50_ms']:>10.1f} -> "
+              f"{result['p50_ms']:>10.1f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per measurement")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated model latency per call (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="simulated generation speed; 0 returns responses instantly")
+    parser.add_argument("--documents", nargs="+", choices=sorted(DOCUMENTS), default=sorted(DOCUMENTS))
+    parser.add_argument("--output", help="report path (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier report to compare p50 latencies with")
+    parser.add_argument("--tolerance", type=float, default=1.2, help="p50 ratio counted as a regression")
+    args = parser.parse_args()
+
+    # Every call reaches the model: no response or answer caching, no rate limiting,
+    # and no question bank generation in the background while operations are timed
+    config.CACHE_ENABLED = False
+    config.ANSWER_CACHE_ENABLED = False
+    config.QUESTION_BANK_ENABLED = False
+    set_backend(ScheduledBackend(
+        LocalBackend(latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=0.0),
+        RequestScheduler(TokenBucket(requests_per_minute=1e9, burst=1e6))
+    ))
+
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.now().isoformat(timespec="seconds"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'runs': args.runs,
+            'model_latency_s': args.latency,
+            'model_tokens_per_second': args.tokens_per_second,
+        },
+        'results': [],
+    }
+    for name in args.documents:
+        file_type, build = DOCUMENTS[name]
+        report['results'].extend(run_document(name, file_type, build(), args.runs))
+
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {output}")
+
+    if args.compare:
+        return 1 if compare(report, args.compare, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
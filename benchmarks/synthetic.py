@@ -0,0 +1,80 @@
+"""
+Deterministic synthetic documents for the benchmarks: research-like prose as TXT bytes or a minimal PDF
+"""
+import random
+
+WORDS = (
+    "model data results method analysis experiment training evaluation baseline accuracy network layer "
+    "attention corpus sample feature error variance signal protein cell gene pathway response treatment "
+    "patient cohort survey policy market price growth region climate energy carbon emission sensor robot "
+    "learning inference latency memory throughput benchmark dataset annotation label noise bias fairness "
+    "theory proof bound estimate parameter distribution regression classification cluster graph node edge"
+).split()
+FILLER = "the of and to in a is that for with as on by this we are from be".split()
+
+
+def sentences(count, seed=0):
+    """count reproducible sentences of 8-24 words"""
+    rng = random.Random(seed)
+    result = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) if rng.random() < 0.6 else rng.choice(FILLER) for _ in range(rng.randint(8, 24))]
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words)), str(rng.randint(1, 999)))
+        result.append(" ".join(words).capitalize() + ".")
+    return result
+
+
+def make_text(size_bytes, seed=0):
+    """UTF-8 text of about size_bytes bytes, in paragraphs of five sentences"""
+    text = []
+    length = 0
+    batch = 0
+    while length < size_bytes:
+        pool = sentences(200, seed * 1000 + batch)
+        for i in range(0, 200, 5):
+            paragraph = " ".join(pool[i:i + 5])
+            text.append(paragraph)
+            length += len(paragraph) + 2
+            if length >= size_bytes:
+                break
+        batch += 1
+    return "\n\n".join(text).encode("utf-8")
+
+
+def _escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(page_count, lines_per_page=40, seed=0):
+    """A valid PDF with page_count pages of text lines in Helvetica (no external dependencies)"""
+    pool = sentences(page_count * lines_per_page // 2 + 1, seed)
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(page_count))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>")
+    font = 3 + 2 * page_count
+    for page in range(page_count):
+        # Two text lines per sentence: sentences are split roughly in half to fit the page width
+        lines = []
+        for sentence in pool[page * lines_per_page // 2:(page + 1) * lines_per_page // 2]:
+            words = sentence.split()
+            lines.extend([" ".join(words[:len(words) // 2]), " ".join(words[len(words) // 2:])])
+        body = " T* ".join(f"({_escape(line)}) Tj" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 72 750 Td {body} ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {4 + 2 * page} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
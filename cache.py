@@ -0,0 +1,185 @@
+"""
+Two-tier response cache for model calls (in-memory LRU + SQLite on disk)
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from storage import connect_sqlite
+
+
+def cache_key(model_name, template, document, params=None):
+    """Build a content-addressed key from model, prompt template, document and parameters"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(template.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(document.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Cache model responses in memory and in a SQLite file with TTL and size limits
+
+    Triggers keep the total size and row count of the disk tier in a one-row table,
+    so checking the size limit after each write does not scan every row.
+    """
+
+    def __init__(self, path=config.CACHE_DB_PATH, ttl=config.CACHE_TTL_SECONDS,
+                 memory_entries=config.CACHE_MEMORY_ENTRIES, max_disk_bytes=config.CACHE_MAX_DISK_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        """Open the SQLite tier on first use"""
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses(created)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_totals ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL, entries INTEGER NOT NULL)"
+            )
+            # Caches created before the totals table start from their current contents
+            conn.execute(
+                "INSERT OR IGNORE INTO response_totals (id, size, entries) "
+                "SELECT 0, COALESCE(SUM(size), 0), COUNT(*) FROM responses"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses BEGIN "
+                "UPDATE response_totals SET size = size + NEW.size, entries = entries + 1; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses BEGIN "
+                "UPDATE response_totals SET size = size - OLD.size, entries = entries - 1; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_update AFTER UPDATE OF size ON responses BEGIN "
+                "UPDATE response_totals SET size = size + NEW.size - OLD.size; END"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key, value, created):
+        """Put an entry in the memory tier, evicting the least recently used"""
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl:
+                    conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            except sqlite3.Error as e:
+                print(f"Response cache read failed: {e}")
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Store value under key in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            try:
+                conn = self._connect()
+                # An upsert, not INSERT OR REPLACE, whose implicit delete would skip the totals trigger
+                conn.execute(
+                    "INSERT INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                    "created = excluded.created, accessed = excluded.accessed",
+                    (key, value, len(value.encode("utf-8")), now, now),
+                )
+                self._evict(conn, now)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Response cache write failed: {e}")
+
+    def _evict(self, conn, now):
+        """Drop expired rows, then least recently used rows until under the size limit
+
+        Each round deletes as many of the oldest rows as, at the average entry size, free
+        the excess; it takes more than one round only when those rows are smaller than average.
+        """
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        while True:
+            total, entries = conn.execute("SELECT size, entries FROM response_totals").fetchone()
+            if total <= self.max_disk_bytes or not entries:
+                return
+            rows = -(-(total - self.max_disk_bytes) * entries // total)
+            evicted = conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?) RETURNING key",
+                (rows,)
+            ).fetchall()
+            for (key,) in evicted:
+                self._memory.pop(key, None)
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            try:
+                conn = self._connect()
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Response cache clear failed: {e}")
+
+    def stats(self):
+        """Return hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+            }
+
+
+response_cache = ResponseCache()
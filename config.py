@@ -8,26 +8,133 @@ load_dotenv()
 
 # API Configuration
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # "gemini" or "local" (offline stand-in)
 GEMINI_MODEL = "gemini-1.5-flash"
+API_CHECK_INTERVAL_SECONDS = 300  # How often the background availability probe runs
+
+# Local stand-in backend (load testing and benchmarks without network)
+LOCAL_BACKEND_LATENCY = float(os.getenv("LOCAL_BACKEND_LATENCY", "0.5"))  # Seconds before the first token
+LOCAL_BACKEND_TOKENS_PER_SECOND = float(os.getenv("LOCAL_BACKEND_TOKENS_PER_SECOND", "200"))  # 0 = unlimited
+LOCAL_BACKEND_RESPONSE_WORDS = 120
+LOCAL_BACKEND_ERROR_RATE = float(os.getenv("LOCAL_BACKEND_ERROR_RATE", "0"))  # Fraction of calls failing with 429
+
+# Request scheduling (rate limit, retries, coalescing of identical prompts)
+SCHEDULER_ENABLED = True
+RATE_LIMIT_RPM = int(os.getenv("RATE_LIMIT_RPM", "60"))  # Size to the API quota; 0 disables rate limiting
+RATE_LIMIT_BURST = 5
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1.0  # Seconds; doubled per attempt, with full jitter
+RETRY_MAX_DELAY = 30.0
 
 # Application Settings
 APP_TITLE = "AI Research Assistant Pro"
 PAGE_LAYOUT = "wide"
 
 # Document Processing
-MAX_TEXT_LENGTH = 30000  # Maximum text length for Gemini API
+CHARS_PER_TOKEN = 4  # Token estimate used for context budgets
+# Document tokens each operation may put into one prompt
+CONTEXT_BUDGETS = {
+    'summary': 8000,  # Per map-reduce chunk; longer documents are split
+    'answer': 1500,
+    'evaluation': 3000,
+    'key_points': 12000,
+    'insights': 12000,
+    'questions': 8000,
+    'analysis': 12000,
+    'corpus_answer': 3000,  # Passages from across the document library
+    'question_bank': 12000,
+}
+# Operations that spread an over-budget context over this many parts of the document
+CONTEXT_SECTIONS = {
+    'key_points': 8,
+    'insights': 8,
+    'questions': 8,
+    'analysis': 8,
+    'question_bank': 8,
+}
 MAX_SUMMARY_WORDS = 150
 DEFAULT_NUM_QUESTIONS = 5
+# Challenge questions used when none can be generated
+DEFAULT_QUESTIONS = [
+    "What is the primary goal or main topic of this document?",
+    "What are the key findings or conclusions presented?",
+    "What methodologies or approaches are discussed in the document?",
+    "What evidence or data supports the main claims?",
+    "What limitations, open questions or recommendations does the document mention?",
+]
+DOCUMENT_STORE_SIZE = 32  # Extracted documents kept in memory across reruns and sessions
+DOCUMENT_FILES_DIR = os.getenv("DOCUMENT_FILES_DIR", os.path.join(".cache", "documents"))  # Memory-mapped text and indexes; "" keeps documents in memory only
+DOCUMENT_FILES_MAX_BYTES = int(os.getenv("DOCUMENT_FILES_MAX_BYTES", str(2 * 1024 ** 3)))  # Least recently used documents beyond this are deleted
+DOCUMENT_FILES_MAX_AGE_SECONDS = 30 * 24 * 3600  # Documents not opened for this long are deleted
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_EXTRACTION_MIN_PAGES = 40  # Smaller PDFs are extracted in-process
+PAGES_PER_TASK = 20
+INGEST_BLOCK_BYTES = 256 * 1024  # TXT uploads are decoded in blocks of this size
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))  # Parallel chunk summaries
+EVALUATION_CONCURRENCY = int(os.getenv("EVALUATION_CONCURRENCY", "4"))  # Parallel gradings when a batch evaluation fails
+
+# Background Jobs (analyses keep running across reruns and page switches)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_HISTORY_SIZE = 256  # Finished jobs kept for sessions that come back for the result
+JOB_POLL_SECONDS = 1.0  # How often the page refreshes a running job's progress
+
+# Retrieval
+CHUNK_SIZE = 1000  # Characters per indexed chunk
+CHUNK_OVERLAP = 200
+RETRIEVAL_TOP_K = 4
+
+# Document Library (multi-document corpus)
+CORPUS_DB_PATH = os.getenv("CORPUS_DB_PATH", os.path.join(".cache", "corpus.sqlite3"))
+CORPUS_INGEST_WORKERS = 2
+CORPUS_JOB_HISTORY_SIZE = 64  # Finished library uploads whose status is remembered
+CORPUS_TOP_K = 6  # Passages retrieved per library question
+CORPUS_COMMON_TERM_FRACTION = 0.1  # Query terms in more of the library's chunks than this are ignored
+
+# Response Cache
+CACHE_ENABLED = True
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join(".cache", "responses.sqlite3"))
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+CACHE_MEMORY_ENTRIES = 256
+CACHE_MAX_DISK_BYTES = 200 * 1024 * 1024
+
+# Answer Cache (Q&A answers shared across sessions, per document)
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_DB_PATH = os.getenv("ANSWER_CACHE_DB_PATH", os.path.join(".cache", "answers.sqlite3"))
+ANSWER_CACHE_SIMILARITY = 0.92  # Trigram cosine similarity for reusing a near-identical question; 1 = exact only
+ANSWER_CACHE_TTL_SECONDS = 30 * 24 * 3600
+ANSWER_CACHE_MAX_PER_DOCUMENT = 500
+ANSWER_CACHE_REFRESH_SECONDS = 30  # How long a process trusts its copy of a document's cached questions
+
+# Question Bank (challenge questions generated once per document, shared by all sessions)
+QUESTION_BANK_ENABLED = True
+QUESTION_BANK_DB_PATH = os.getenv("QUESTION_BANK_DB_PATH", os.path.join(".cache", "questions.sqlite3"))
+QUESTION_BANK_SIZE = 20  # Questions generated per document
+
+# Tracing (model calls and ingestion steps)
+TRACE_BUFFER_SIZE = 5000  # Most recent spans kept for the dashboard
+TRACE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # Prometheus histogram bounds in seconds
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "")  # Append every span to this file as JSON lines
 
 # File Types
 SUPPORTED_FILE_TYPES = ["pdf", "txt"]
 
 # Analytics
-ANALYTICS_FILE = "analytics.json"
-SESSION_HISTORY_LIMIT = 5
+ANALYTICS_FILE = "analytics.json"  # Legacy counters, imported into the metrics database once
+METRICS_DB_PATH = os.getenv("METRICS_DB_PATH", os.path.join(".cache", "metrics.sqlite3"))
+METRICS_FLUSH_SECONDS = 2.0
+METRICS_READ_TTL_SECONDS = 5.0
+SESSION_HISTORY_LIMIT = 5  # Q&A entries shown on the Q&A page
+SESSION_HISTORY_MEMORY = 20  # Q&A entries kept in memory per session; older ones go to the session log
+SESSION_LOG_DIR = os.getenv("SESSION_LOG_DIR", os.path.join(".cache", "sessions"))  # "" drops older entries instead
+SESSION_LOG_MAX_AGE_SECONDS = 7 * 24 * 3600
 
 # Export Settings
-EXPORT_FORMATS = ["json", "csv"]
+EXPORT_FORMATS = ["jsonl", "csv", "parquet"]  # Parquet is offered when pyarrow is installed
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")  # Session event logs and finished exports
+EXPORT_LOG_COMPRESSION = os.getenv("EXPORT_LOG_COMPRESSION", "")  # "", "gzip" or "zstd" for the event logs
+EXPORT_LOG_MAX_AGE_SECONDS = 7 * 24 * 3600  # Event logs idle this long are deleted
+EXPORT_BATCH_ROWS = 1000  # Rows per Parquet record batch
+EXPORT_DOWNLOAD_MAX_BYTES = 50 * 1024 * 1024  # Larger exports are only written to EXPORT_DIR
 
 # UI Settings
 SIDEBAR_STATE = "expanded"
@@ -40,9 +147,14 @@ SUMMARY_ERROR_MESSAGE = "Summary error: {}"
 ANSWER_ERROR_MESSAGE = "Answer error: {}"
 
 # Prompts
-SUMMARY_PROMPT = "Summarize the following text in approximately {} words:\n\n{}"
-QUESTION_PROMPT = "Based on the following document, generate {} thoughtful questions that would help someone understand the key concepts and main points.\n\nDocument:\n{}\n\nGenerate {} questions:"
-ANSWER_PROMPT = "You are a helpful research assistant. Use the following document to answer the question.\n\nDocument:\n{}\n\nQuestion: {}\n\nPlease provide a clear and accurate answer based on the document content."
-EVALUATION_PROMPT = "Evaluate this answer based on the document.\n\nQuestion: {}\nUser Answer: {}\n\nProvide constructive feedback and a score out of 10."
-KEY_POINTS_PROMPT = "Extract 5-7 key points from the following document. Format as a bulleted list:\n\n{}"
-INSIGHTS_PROMPT = "Analyze the following document and provide 3-4 insights about:\n1. Main themes and patterns\n2. Potential implications\n3. Areas for further research\n\nDocument:\n{}" 
\ No newline at end of file
+SUMMARY_PROMPT = "Summarize the following text in approximately {max_words} words:\n\n{document}"
+SUMMARY_REDUCE_PROMPT = "The following are summaries of consecutive sections of one document. Combine them into a single coherent summary of approximately {max_words} words:\n\n{document}"
+QUESTION_PROMPT = "Based on the following document, generate {num_questions} thoughtful questions that would help someone understand the key concepts and main points.\n\nDocument:\n{document}\n\nRespond with only a JSON array of {num_questions} question strings."
+ANSWER_PROMPT = "You are a helpful research assistant. Use the following document to answer the question.\n\nDocument:\n{document}\n\nQuestion: {question}\n\nPlease provide a clear and accurate answer based on the document content."
+QUESTION_BANK_PROMPT = "Based on the following document, write {num_questions} thoughtful questions that test understanding of its key concepts and main points, spread over the whole document. For each question give a short reference answer and quote the sentence from the document that supports it, word for word.\n\nDocument:\n{document}\n\nRespond with only a JSON array of {num_questions} objects with the keys \"question\", \"answer\" and \"source\"."
+EVALUATION_PROMPT = "Evaluate this answer based on the document.\n\nQuestion: {question}\nUser Answer: {answer}\n\nProvide constructive feedback and a score out of 10."
+EVALUATION_BATCH_PROMPT = "Evaluate each of the user's answers below based on the document.\n\nDocument:\n{document}\n\n{answers}\n\nRespond with only a JSON array containing one object per answer, in the same order, with the keys \"number\" (the answer number), \"score\" (an integer from 0 to 10) and \"feedback\" (constructive feedback as a string)."
+KEY_POINTS_PROMPT = "Extract 5-7 key points from the following document. Format as a bulleted list:\n\n{document}"
+ANALYSIS_PROMPT = "Analyze the following document and respond with only a JSON object with these keys:\n\"summary\": a summary of approximately {max_words} words (string),\n\"key_points\": 5-7 key points (array of strings),\n\"insights\": 3-4 insights about the main themes and patterns, potential implications and areas for further research (string),\n\"questions\": {num_questions} thoughtful questions that would help someone understand the key concepts and main points (array of strings).\n\nDocument:\n{document}"
+CORPUS_ANSWER_PROMPT = "You are a helpful research assistant. Use the following numbered passages from several documents to answer the question. Cite the passages you use with their numbers in square brackets, e.g. [2].\n\nPassages:\n{document}\n\nQuestion: {question}\n\nIf the passages do not contain the answer, say so."
+INSIGHTS_PROMPT = "Analyze the following document and provide 3-4 insights about:\n1. Main themes and patterns\n2. Potential implications\n3. Areas for further research\n\nDocument:\n{document}"
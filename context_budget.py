@@ -0,0 +1,93 @@
+"""
+Token-aware context budgets: fit whole sentences of a document into each operation's prompt
+"""
+import re
+
+import config
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+SECTION_SEPARATOR = "\n\n[...]\n\n"
+
+
+def estimate_tokens(text):
+    """Approximate token count (about CHARS_PER_TOKEN characters per token for English text)"""
+    return -(-len(text) // config.CHARS_PER_TOKEN)
+
+
+def budget_for(operation):
+    """Token budget declared for an operation in config.CONTEXT_BUDGETS"""
+    return config.CONTEXT_BUDGETS[operation]
+
+
+def split_sentences(text):
+    """Split normalized text into sentences"""
+    return [sentence for sentence in SENTENCE_END.split(text) if sentence]
+
+
+def _take(sentences, budget):
+    """Leading whole sentences of a section that fit into budget tokens"""
+    taken = []
+    used = 0
+    for sentence in sentences:
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > budget:
+            if not taken:
+                # A single sentence larger than the budget (e.g. a table): cut it at a word
+                cut = sentence[:budget * config.CHARS_PER_TOKEN].rsplit(" ", 1)[0]
+                if cut:
+                    taken.append(cut)
+                    used += estimate_tokens(cut) + 1
+            break
+        taken.append(sentence)
+        used += cost
+    return taken, used
+
+
+def fill_budget(sentences, budget, sections=1):
+    """Fill budget tokens with whole sentences and report how much of the document was used
+
+    With sections > 1 the document is cut into that many equal parts and each part
+    contributes its opening sentences, so the context covers the whole document rather
+    than only its beginning. Returns (context, coverage).
+    """
+    costs = [estimate_tokens(sentence) + 1 for sentence in sentences]
+    total = sum(costs)
+    if total <= budget:
+        chosen = [sentences]
+    else:
+        sections = max(1, min(sections, len(sentences)))
+        # Section boundaries at equal shares of the document's tokens
+        bounds = [0]
+        running = 0
+        for i, cost in enumerate(costs):
+            running += cost
+            if len(bounds) < sections and running >= total * len(bounds) / sections:
+                bounds.append(i + 1)
+        bounds.append(len(sentences))
+        share = budget // (len(bounds) - 1)
+        chosen = [_take(sentences[start:end], share)[0] for start, end in zip(bounds, bounds[1:])]
+        chosen = [part for part in chosen if part]
+
+    included = sum(len(part) for part in chosen)
+    context = SECTION_SEPARATOR.join(" ".join(part) for part in chosen)
+    used = estimate_tokens(context)
+    coverage = {
+        'budget_tokens': budget,
+        'used_tokens': used,
+        'document_tokens': total,
+        'fraction': min(1.0, used / total) if total else 1.0,
+        'sentences': included,
+        'total_sentences': len(sentences),
+        'sections': len(chosen),
+        'complete': total <= budget,
+    }
+    return context, coverage
+
+
+def budget_context(document, operation):
+    """Return (context, coverage) for a Document under the operation's budget, computed once per document"""
+    sections = config.CONTEXT_SECTIONS.get(operation, 1)
+    return document.derive(
+        ('context', operation),
+        lambda: fill_budget(document.sentences, budget_for(operation), sections)
+    )
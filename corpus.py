@@ -0,0 +1,238 @@
+"""
+Document library: many documents ingested in the background and searched together (SQLite FTS5 on disk)
+"""
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from documents import content_hash
+from ingestion import ingest
+from retrieval import split_chunks, tokenize
+from storage import connect_sqlite
+from tracing import tracer
+
+# Words too common to help ranking; leaving them out keeps queries from touching every chunk
+QUERY_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "for", "from", "how", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "were", "what", "when", "where", "which", "who",
+    "why", "with",
+}
+
+
+def fold_diacritics(term):
+    """term as the unicode61 tokenizer stores it in the index, without diacritics"""
+    return "".join(ch for ch in unicodedata.normalize("NFD", term) if not unicodedata.combining(ch))
+
+
+class Corpus:
+    """Persistent library of documents with a full-text index over page-aligned chunks
+
+    Documents are ingested on a small thread pool (large PDFs additionally use the
+    extraction process pool), and their page counts and chunks are stored in one
+    SQLite file, so the library survives restarts and is shared by all sessions.
+    """
+
+    def __init__(self, path=config.CORPUS_DB_PATH, workers=config.CORPUS_INGEST_WORKERS,
+                 max_finished=config.CORPUS_JOB_HISTORY_SIZE):
+        self.path = path
+        self.workers = workers
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pool = None
+        # content hash -> {'name', 'status', 'error'} for uploads submitted in this process;
+        # only the last max_finished done or failed ones are kept
+        self.jobs = OrderedDict()
+
+    def _connect(self):
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "doc_hash TEXT PRIMARY KEY, name TEXT NOT NULL, pages INTEGER NOT NULL, chunks INTEGER NOT NULL, "
+                "words INTEGER NOT NULL, added REAL NOT NULL)"
+            )
+            # Libraries created before the chunks held all the text also stored every document whole
+            if "text" in [row[1] for row in conn.execute("PRAGMA table_info(documents)")]:
+                conn.execute("ALTER TABLE documents DROP COLUMN text")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+                "text, doc_hash UNINDEXED, page UNINDEXED, tokenize='unicode61')"
+            )
+            # Per-term chunk counts, used to leave out terms that occur nearly everywhere
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5vocab(chunks, row)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def __contains__(self, doc_hash):
+        with self._lock:
+            return self._connect().execute(
+                "SELECT 1 FROM documents WHERE doc_hash = ?", (doc_hash,)
+            ).fetchone() is not None
+
+    def add_document(self, document):
+        """Index an extracted Document; documents already in the library are skipped"""
+        if document.content_hash is None:
+            return False
+        rows = [
+            (chunk, document.content_hash, page)
+            for page in range(len(document.page_offsets))
+            for chunk in split_chunks(document.page_text(page))
+        ]
+        with self._lock:
+            conn = self._connect()
+            if conn.execute("SELECT 1 FROM documents WHERE doc_hash = ?", (document.content_hash,)).fetchone():
+                return False
+            with conn:
+                conn.execute(
+                    "INSERT INTO documents (doc_hash, name, pages, chunks, words, added) VALUES (?, ?, ?, ?, ?, ?)",
+                    (document.content_hash, document.name or document.content_hash[:12], len(document.page_offsets),
+                     len(rows), document.metrics.get('words', 0), time.time())
+                )
+                conn.executemany("INSERT INTO chunks (text, doc_hash, page) VALUES (?, ?, ?)", rows)
+        return True
+
+    def _update(self, key, **fields):
+        """Update a job from a pool thread, forgetting the oldest finished jobs over the limit"""
+        with self._lock:
+            job = self.jobs.get(key)
+            if job is None:
+                return
+            job.update(fields)
+            if job['status'] in ("done", "failed"):
+                self.jobs.move_to_end(key)
+                finished = [old for old, job in self.jobs.items() if job['status'] in ("done", "failed")]
+                for old in finished[:max(0, len(finished) - self.max_finished)]:
+                    del self.jobs[old]
+
+    def _ingest(self, key, name, data, file_type):
+        self._update(key, status="extracting")
+        try:
+            with tracer.span('corpus_extract', 'ingestion'):
+                pipeline = ingest(data, file_type, key, name)
+                while True:
+                    try:
+                        next(pipeline)
+                    except StopIteration as finished:
+                        document = finished.value
+                        break
+            self._index(key, name, document)
+        except Exception as e:
+            print(f"Failed to add {name} to the library: {e}")
+            self._update(key, status="failed", error=str(e))
+
+    def _index(self, key, name, document):
+        self._update(key, status="indexing")
+        try:
+            with tracer.span('corpus_index', 'ingestion'):
+                self.add_document(document)
+            self._update(key, status="done")
+        except Exception as e:
+            print(f"Failed to add {name} to the library: {e}")
+            self._update(key, status="failed", error=str(e))
+
+    def _queue(self, key, name, task, *args):
+        """Run task on the ingestion pool unless key is already queued, indexed or in the library"""
+        with self._lock:
+            job = self.jobs.get(key)
+            if job is not None and job['status'] != "failed":
+                return key
+            self.jobs[key] = {'name': name, 'status': "queued", 'error': None}
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="corpus-ingest")
+        if key in self:
+            self._update(key, status="done")
+        else:
+            self._pool.submit(task, key, name, *args)
+        return key
+
+    def submit(self, name, data, file_type):
+        """Queue an upload for background ingestion; returns its content hash"""
+        return self._queue(content_hash(data), name, self._ingest, data, file_type)
+
+    def submit_document(self, document):
+        """Queue an already extracted Document for background indexing; returns its content hash"""
+        if document.content_hash is None:
+            return None
+        name = document.name or document.content_hash[:12]
+        return self._queue(document.content_hash, name, self._index, document)
+
+    def pending(self):
+        """Names of uploads still being ingested"""
+        with self._lock:
+            return [job['name'] for job in self.jobs.values() if job['status'] not in ("done", "failed")]
+
+    def search(self, query, top_k=config.CORPUS_TOP_K):
+        """Return the best matching passages across all documents, best first
+
+        Each passage is a dict with doc_hash, name, page (0-based), text and score.
+        """
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term not in QUERY_STOPWORDS]
+        if not terms:
+            return []
+        try:
+            with self._lock:
+                conn = self._connect()
+                terms = self._selective_terms(conn, terms)
+                if not terms:
+                    return []
+                match = " OR ".join(f'"{term}"' for term in terms)
+                rows = conn.execute(
+                    "SELECT c.doc_hash, d.name, c.page, c.text, c.rank FROM "
+                    "(SELECT doc_hash, page, text, rank FROM chunks WHERE chunks MATCH ? ORDER BY rank LIMIT ?) c "
+                    "JOIN documents d ON d.doc_hash = c.doc_hash ORDER BY c.rank",
+                    (match, top_k)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Library search failed: {e}")
+            return []
+        return [
+            {'doc_hash': doc_hash, 'name': name, 'page': int(page), 'text': text, 'score': -rank}
+            for doc_hash, name, page, text, rank in rows
+        ]
+
+    def _selective_terms(self, conn, terms):
+        """Drop query terms found in more than CORPUS_COMMON_TERM_FRACTION of all chunks
+
+        Ranking has to score every chunk a term occurs in, so a term like "model" in a
+        library of ML papers would make each query scan most of the index while adding
+        almost nothing to the ranking. If every term is that common, only the rarest is kept.
+        """
+        total = conn.execute("SELECT COALESCE(SUM(chunks), 0) FROM documents").fetchone()[0]
+        folded = {term: fold_diacritics(term) for term in terms}
+        counts = dict(conn.execute(
+            f"SELECT term, doc FROM chunk_terms WHERE term IN ({', '.join('?' * len(terms))})", list(folded.values())
+        ).fetchall())
+        found = sorted((term for term in terms if folded[term] in counts), key=lambda term: counts[folded[term]])
+        selective = [term for term in found if counts[folded[term]] <= total * config.CORPUS_COMMON_TERM_FRACTION]
+        return selective or found[:1]
+
+    def remove(self, doc_hash):
+        """Delete a document and its chunks from the library"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM chunks WHERE doc_hash = ?", (doc_hash,))
+                conn.execute("DELETE FROM documents WHERE doc_hash = ?", (doc_hash,))
+            self.jobs.pop(doc_hash, None)
+
+    def documents(self):
+        """(doc_hash, name, pages, words) of every document, most recently added first"""
+        with self._lock:
+            return self._connect().execute(
+                "SELECT doc_hash, name, pages, words FROM documents ORDER BY added DESC"
+            ).fetchall()
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            documents, words = conn.execute("SELECT COUNT(*), COALESCE(SUM(words), 0) FROM documents").fetchone()
+        return {'documents': documents, 'words': words, 'pending': len(self.pending())}
+
+
+corpus = Corpus()
@@ -0,0 +1,285 @@
+"""
+Process-wide store of extracted documents keyed by the content hash of the uploaded bytes
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from context_budget import estimate_tokens, split_sentences
+from retrieval import TOKENIZER_VERSION, ChunkIndex
+from storage import StringTable
+
+
+def content_hash(data):
+    """SHA-256 of the raw uploaded bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class Document:
+    """Extracted text of an uploaded file with everything derived from it computed once
+
+    Normalized text, sentences, token estimate, chunk index and per-operation contexts are
+    built on first use and kept on the object, so repeated operations on the same
+    document do not rescan the text. They are built page by page, so a memory-mapped
+    document never joins its pages into one string to derive them.
+    """
+
+    def __init__(self, content_hash, text, page_offsets=None, name=None, failed_pages=None, metrics=None, pages=None):
+        self.content_hash = content_hash
+        self._text = text
+        # StringTable of page texts when the document is memory-mapped from its files
+        self._pages = pages
+        self.page_offsets = page_offsets or [0]
+        self.name = name
+        self.failed_pages = failed_pages or []
+        self.metrics = dict(metrics) if metrics else {
+            'characters': len(text),
+            'words': len(text.split()),
+            'sentences': len(text.split('.')),
+        }
+        self.metrics['pages'] = len(self.page_offsets)
+        self.chunk_index = None
+        self._derived = {}
+
+    @property
+    def text(self):
+        """Full text; a memory-mapped document joins its pages on every access, so use pages() instead"""
+        if self._text is not None:
+            return self._text
+        return "\n".join(self._pages)
+
+    @classmethod
+    def from_text(cls, text, name=None):
+        """Wrap plain text (e.g. from callers that pass a string) in a Document"""
+        return cls(content_hash(text.encode("utf-8", errors="replace")), text, name=name)
+
+    def pages(self):
+        """Yield the text of each page in order"""
+        for page in range(len(self.page_offsets)):
+            yield self.page_text(page)
+
+    def derive(self, key, build, whole_text=False):
+        """Return the value cached under key, computing it with build() the first time
+
+        A whole_text value (as large as the text itself) is not kept on a memory-mapped
+        document, whose text stays in the page cache; it is rebuilt for each operation.
+        """
+        if whole_text and isinstance(self._pages, StringTable):
+            return build()
+        try:
+            return self._derived[key]
+        except KeyError:
+            value = self._derived[key] = build()
+            return value
+
+    @property
+    def normalized(self):
+        """Text with whitespace runs collapsed, as sent to the model"""
+        return self.derive('normalized', lambda: " ".join(filter(None, self._normalized_pages())), whole_text=True)
+
+    @property
+    def sentences(self):
+        return self.derive(
+            'sentences', lambda: [s for page in self._normalized_pages() for s in split_sentences(page)], whole_text=True
+        )
+
+    @property
+    def tokens(self):
+        """Estimated token count of the normalized text"""
+        return self.derive('tokens', lambda: sum(estimate_tokens(page) for page in self._normalized_pages()))
+
+    def _normalized_pages(self):
+        for page in self.pages():
+            yield re.sub(r"\s+", " ", page).strip()
+
+    def page_text(self, page_number):
+        """Return the text of one page (0-based)"""
+        if self._pages is not None:
+            return self._pages[page_number]
+        start = self.page_offsets[page_number]
+        # Pages are joined with a one-character separator
+        end = self.page_offsets[page_number + 1] - 1 if page_number + 1 < len(self.page_offsets) else len(self._text)
+        return self._text[start:end]
+
+
+def staging_directory(directory, content_hash):
+    """Create a temporary directory for a document's files, renamed into place by save_document_files"""
+    path = f"{os.path.join(directory, content_hash)}.tmp-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save_document_files(document, directory, staged=None):
+    """Write a document's pages, metadata and chunk index under directory/<content hash>
+
+    Files are written to a temporary directory and renamed into place, so readers in
+    other sessions or processes never see a half-written document. staged is a
+    staging_directory that already holds the pages (ingest writes them there).
+    """
+    target = os.path.join(directory, document.content_hash)
+    if os.path.isdir(target):
+        if staged:
+            shutil.rmtree(staged, ignore_errors=True)
+        return target
+    temporary = staged or staging_directory(directory, document.content_hash)
+    try:
+        if not staged:
+            StringTable.write(os.path.join(temporary, "pages"), document.pages())
+        if document.chunk_index is not None:
+            document.chunk_index.save(temporary)
+        with open(os.path.join(temporary, "meta.json"), "w") as f:
+            json.dump({
+                'name': document.name,
+                'page_offsets': document.page_offsets,
+                'failed_pages': document.failed_pages,
+                'metrics': document.metrics,
+                'tokenizer': TOKENIZER_VERSION,
+            }, f)
+        os.rename(temporary, target)
+    except OSError:
+        shutil.rmtree(temporary, ignore_errors=True)
+        # Another process may have saved the same document first
+        if not os.path.isdir(target):
+            raise
+    return target
+
+
+def open_document_files(content_hash, directory):
+    """Memory-map a document saved by save_document_files, or return None if there is none"""
+    path = os.path.join(directory, content_hash)
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        # The directory's modification time records its last use, for prune_document_files
+        os.utime(path)
+        document = Document(content_hash, None, meta['page_offsets'], meta['name'], meta['failed_pages'],
+                            meta['metrics'], pages=StringTable.open(os.path.join(path, "pages")))
+        # An index saved with an older tokenizer is left out and rebuilt on the first question
+        if meta.get('tokenizer') == TOKENIZER_VERSION and os.path.exists(os.path.join(path, "chunks.utf8")):
+            document.chunk_index = ChunkIndex.load(path)
+        return document
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _directory_size(path):
+    with os.scandir(path) as entries:
+        return sum(entry.stat().st_size for entry in entries if entry.is_file())
+
+
+def prune_document_files(directory, max_bytes, max_age, keep=()):
+    """Delete whole saved documents, least recently opened first
+
+    Documents not opened for max_age seconds are deleted, then older ones until the
+    rest fit in max_bytes. Content hashes in keep are never deleted. Staging directories
+    older than max_age were left by an ingestion that failed and are deleted too.
+    """
+    cutoff = time.time() - max_age
+    try:
+        with os.scandir(directory) as entries:
+            saved = []
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                if ".tmp-" not in entry.name:
+                    saved.append((entry.stat().st_mtime, entry.name, entry.path))
+                elif entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+        sizes = {path: _directory_size(path) for _, _, path in saved}
+    except OSError as e:
+        print(f"Could not check saved documents: {e}")
+        return
+    total = sum(sizes.values())
+    for used, name, path in sorted(saved):
+        if total <= max_bytes and used >= cutoff:
+            break
+        if name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+            total -= sizes[path]
+
+
+class DocumentStore:
+    """LRU cache of extracted documents shared by all sessions in the process
+
+    With a directory, every stored document is also written to compact files there
+    (see save_document_files) and the store keeps the memory-mapped version, so the
+    text and chunk index live in the OS page cache instead of the Python heap. Documents
+    evicted from memory, or saved by another process, are reopened from their files.
+    Each save prunes the directory to max_bytes and max_age (see prune_document_files),
+    sparing the documents held in memory.
+    """
+
+    def __init__(self, max_documents=config.DOCUMENT_STORE_SIZE, directory=config.DOCUMENT_FILES_DIR,
+                 max_bytes=config.DOCUMENT_FILES_MAX_BYTES, max_age=config.DOCUMENT_FILES_MAX_AGE_SECONDS):
+        self.max_documents = max_documents
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the stored document for a content hash, or None"""
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                return document
+        if self.directory and key:
+            document = open_document_files(key, self.directory)
+            if document is not None:
+                self._remember(document)
+        return document
+
+    def stage(self, key):
+        """A staging directory for ingest to write a new document's pages to, or None without a directory"""
+        if not (self.directory and key):
+            return None
+        try:
+            return staging_directory(self.directory, key)
+        except OSError as e:
+            print(f"Could not create document files, keeping the document in memory: {e}")
+            return None
+
+    def put(self, document, staged=None):
+        """Store a document, evicting the least recently used ones over the limit; returns the stored copy
+
+        staged is the stage() directory the document's pages were ingested into, if any.
+        """
+        if self.directory and document.content_hash:
+            try:
+                save_document_files(document, self.directory, staged)
+                with self._lock:
+                    keep = set(self._documents) | {document.content_hash}
+                prune_document_files(self.directory, self.max_bytes, self.max_age, keep)
+                mapped = open_document_files(document.content_hash, self.directory)
+                if mapped is not None:
+                    document = mapped
+            except OSError as e:
+                print(f"Could not save document files, keeping the document in memory: {e}")
+        self._remember(document)
+        return document
+
+    def _remember(self, document):
+        with self._lock:
+            self._documents[document.content_hash] = document
+            self._documents.move_to_end(document.content_hash)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._documents
+
+    def __len__(self):
+        with self._lock:
+            return len(self._documents)
+
+
+document_store = DocumentStore()
@@ -0,0 +1,195 @@
+"""
+Streaming session export: an append-only event log per session, converted to JSON Lines, CSV or Parquet
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import config
+from history import prune_session_logs
+
+# Every exported record has these fields, so CSV and Parquet exports have a fixed schema
+EXPORT_COLUMNS = ('timestamp', 'event', 'document', 'question', 'answer', 'feedback', 'text')
+EXTENSIONS = {'jsonl': ".jsonl", 'csv': ".csv", 'parquet': ".parquet"}
+COMPRESSION_EXTENSIONS = {'gzip': ".gz", 'zstd': ".zst"}
+LOG_SUFFIXES = tuple(".events.jsonl" + extension for extension in ("", *COMPRESSION_EXTENSIONS.values()))
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+def available_formats():
+    return [fmt for fmt in config.EXPORT_FORMATS if fmt != "parquet" or pq is not None]
+
+
+def available_compressions():
+    return ["none", "gzip"] + (["zstd"] if zstandard is not None else [])
+
+
+def open_compressed(file, mode, compression=None):
+    """Binary file object for a path or open binary file; gzip and zstd files may hold several appended members/frames"""
+    if compression == "gzip":
+        return gzip.open(file, mode)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package")
+        raw = open(file, mode) if isinstance(file, str) else file
+        if "r" in mode:
+            return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+    return open(file, mode) if isinstance(file, str) else file
+
+
+class FilePrefix(io.RawIOBase):
+    """The first size bytes of an open binary file, so a reader stops where the file ended when it started"""
+
+    def __init__(self, f, size):
+        self._f = f
+        self._left = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._f.read(min(len(buffer), self._left))
+        buffer[:len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+
+def export_row(record):
+    """A record with exactly the export columns, lists joined into one text field"""
+    row = {}
+    for column in EXPORT_COLUMNS:
+        value = record.get(column)
+        if isinstance(value, (list, tuple)):
+            value = "\n".join(str(item) for item in value)
+        row[column] = "" if value is None else str(value)
+    return row
+
+
+def _write_text(records, path, fmt, compression):
+    with io.TextIOWrapper(open_compressed(path, "wb", compression), encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS)
+            writer.writeheader()
+            for record in records:
+                writer.writerow(export_row(record))
+        else:
+            for record in records:
+                f.write(json.dumps(export_row(record)) + "\n")
+
+
+def _write_parquet(records, path, compression, batch_rows):
+    if pq is None:
+        raise RuntimeError("Parquet export needs the pyarrow package")
+    schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+    # Parquet compresses inside the file, per column chunk
+    with pq.ParquetWriter(path, schema, compression=compression or "none") as writer:
+        batch = []
+        for record in records:
+            batch.append(export_row(record))
+            if len(batch) >= batch_rows:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+
+
+def write_export(records, path, fmt="jsonl", compression=None, batch_rows=config.EXPORT_BATCH_ROWS):
+    """Stream records (dicts) into path in the given format
+
+    Records are written one at a time (Parquet: batch_rows at a time) to a temporary
+    file that is renamed over path only when complete, so readers never see a partial
+    export. Returns path.
+    """
+    if compression == "none":
+        compression = None
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        if fmt == "parquet":
+            _write_parquet(records, temp_path, compression, batch_rows)
+        elif fmt in ("jsonl", "csv"):
+            _write_text(records, temp_path, fmt, compression)
+        else:
+            raise ValueError(f"unknown export format: {fmt}")
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+
+class SessionLog:
+    """Append-only JSON lines log of one session's events (questions, answers, feedback, analyses)
+
+    Each event is appended as it happens, so an export only has to stream the log
+    through write_export. Appending to a compressed log adds a gzip member or zstd frame.
+    Logs of other sessions not written to for EXPORT_LOG_MAX_AGE_SECONDS are deleted.
+    """
+
+    def __init__(self, session_id, directory=config.EXPORT_DIR, compression=config.EXPORT_LOG_COMPRESSION):
+        self.session_id = session_id
+        self.directory = directory
+        self.compression = compression or None
+        self.path = os.path.join(directory, f"{session_id}.events.jsonl" + COMPRESSION_EXTENSIONS.get(compression, ""))
+        self.count = 0
+        self._lock = threading.Lock()
+        prune_session_logs(directory, config.EXPORT_LOG_MAX_AGE_SECONDS, LOG_SUFFIXES)
+
+    def record(self, event, **fields):
+        """Append one event; list values (key points, questions) are kept as lists"""
+        fields.update(timestamp=datetime.now().isoformat(), event=event)
+        line = (json.dumps(fields) + "\n").encode("utf-8")
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open_compressed(self.path, "ab", self.compression) as f:
+                    f.write(line)
+                self.count += 1
+            except (OSError, RuntimeError) as e:
+                print(f"Could not record session event: {e}")
+
+    def records(self, limit=None):
+        """Logged events oldest first, at most limit of them
+
+        Only the events logged when reading starts are read: the file is read up to its
+        size at that moment, so an event being appended meanwhile is never half read.
+        """
+        with self._lock:
+            count = self.count
+            size = os.path.getsize(self.path) if count else 0
+        if limit is not None:
+            count = min(count, limit)
+        if not count:
+            return
+        with open(self.path, "rb") as f:
+            with open_compressed(io.BufferedReader(FilePrefix(f, size)), "rb", self.compression) as raw:
+                for n, line in enumerate(io.TextIOWrapper(raw, encoding="utf-8")):
+                    if n >= count:
+                        break
+                    yield json.loads(line)
+
+    def __len__(self):
+        return self.count
+
+    def export(self, fmt="jsonl", compression=None, events=None):
+        """Write the first events logged events (default: all) to a new file in directory; returns its path"""
+        name = f"session-{self.session_id[:8]}-{datetime.now():%Y%m%d_%H%M%S}{EXTENSIONS[fmt]}"
+        if fmt != "parquet":
+            name += COMPRESSION_EXTENSIONS.get(compression, "")
+        return write_export(self.records(events), os.path.join(self.directory, name), fmt, compression)
@@ -0,0 +1,128 @@
+"""
+Page-parallel text extraction for uploaded documents
+"""
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+
+from PyPDF2 import PdfReader
+
+import config
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Shared worker pool, started on first large document"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a multi-threaded Streamlit server is not safe
+            _pool = ProcessPoolExecutor(
+                max_workers=config.EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def extract_page_range(reader, start, stop):
+    """Extract pages [start, stop) from a PdfReader; a page that fails yields "" and is reported"""
+    pages = []
+    failed = []
+    for number in range(start, stop):
+        try:
+            pages.append(reader.pages[number].extract_text() or "")
+        except Exception as e:
+            print(f"Failed to extract page {number + 1}: {e}")
+            pages.append("")
+            failed.append(number)
+    return pages, failed
+
+
+# Worker processes keep the reader of the PDF they last worked on, so each parses it once
+_worker_reader = (None, None)
+
+
+def _extract_file_range(path, start, stop):
+    """Worker task: extract pages [start, stop) of the PDF file at path"""
+    global _worker_reader
+    if _worker_reader[0] != path:
+        _worker_reader = (path, PdfReader(path))
+    return extract_page_range(_worker_reader[1], start, stop)
+
+
+def _page_ranges(page_count):
+    size = config.PAGES_PER_TASK
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def iter_pdf_pages(data):
+    """Yield (page_number, page_count, text, failed) in page order as pages are decoded
+
+    Large PDFs are extracted on the worker pool; pages are yielded as soon as their
+    range completes, so callers can start on early pages while later ones are parsed.
+    The PDF is written to a temporary file once and workers read it from there, so
+    tasks carry only their page range instead of a copy of the whole file.
+    """
+    reader = PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+    ranges = _page_ranges(page_count)
+
+    futures = None
+    path = None
+    try:
+        if page_count >= config.PARALLEL_EXTRACTION_MIN_PAGES and config.EXTRACTION_WORKERS > 1:
+            try:
+                pool = _get_pool()
+                with tempfile.NamedTemporaryFile("wb", suffix=".pdf", delete=False) as f:
+                    path = f.name
+                    f.write(data)
+                futures = [pool.submit(_extract_file_range, path, start, stop) for start, stop in ranges]
+            except Exception as e:
+                # e.g. a broken pool or a sandbox that forbids subprocesses; extract in-process instead
+                print(f"Parallel extraction unavailable, falling back to serial: {e}")
+
+        for index, (start, stop) in enumerate(ranges):
+            pages = None
+            if futures is not None:
+                try:
+                    pages, failed = futures[index].result()
+                except Exception as e:
+                    print(f"Worker failed on pages {start + 1}-{stop}, retrying in-process: {e}")
+            if pages is None:
+                pages, failed = extract_page_range(reader, start, stop)
+            for number, text in enumerate(pages, start):
+                yield number, page_count, text, number in failed
+    finally:
+        if futures is not None:
+            # Abandoned early: drop the ranges not started yet before removing the file
+            for future in futures:
+                future.cancel()
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def extract_pdf(data):
+    """Return (text, page_offsets, failed_pages) for PDF bytes"""
+    pages = []
+    failed_pages = []
+    for number, _, text, failed in iter_pdf_pages(data):
+        pages.append(text)
+        if failed:
+            failed_pages.append(number)
+    return assemble_pages(pages) + (failed_pages,)
+
+
+def assemble_pages(pages):
+    """Join page texts in linear time and return (text, page start offsets)"""
+    separator = "\n"
+    offsets = [0] + list(accumulate(len(page) + len(separator) for page in pages[:-1]))
+    return separator.join(pages), offsets
@@ -0,0 +1,156 @@
+"""
+Per-session Q&A history and challenge answers: compact records, bounded memory, older entries on disk
+"""
+import json
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+import config
+
+
+class HistoryEntry:
+    """One question asked in the Q&A page and the answer given"""
+
+    __slots__ = ('timestamp', 'question', 'answer', 'scope')
+
+    def __init__(self, question, answer, scope="document", timestamp=None):
+        self.timestamp = timestamp or datetime.now().isoformat()
+        self.question = question
+        self.answer = answer
+        # "document" or "library"
+        self.scope = scope
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ChallengeItem:
+    """A challenge question with the user's answer and the feedback on it (score: 0-10 or None)
+
+    Questions from the question bank also carry their id, a reference answer and the
+    supporting quote with its page (0-based; None if the quote was not found).
+    """
+
+    __slots__ = ('question', 'answer', 'feedback', 'score', 'question_id', 'reference', 'source', 'source_page')
+
+    def __init__(self, question, answer="", feedback="", question_id=None, reference="", source="", source_page=None,
+                 score=None):
+        self.question = question
+        self.answer = answer
+        self.feedback = feedback
+        self.score = score
+        self.question_id = question_id
+        self.reference = reference
+        self.source = source
+        self.source_page = source_page
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def challenge_items(questions):
+    """Fresh ChallengeItems for question strings or question bank dicts"""
+    items = []
+    for question in questions:
+        if isinstance(question, dict):
+            items.append(ChallengeItem(
+                question['question'], question_id=question.get('id'), reference=question.get('answer') or "",
+                source=question.get('source') or "", source_page=question.get('source_page')
+            ))
+        else:
+            items.append(ChallengeItem(question))
+    return items
+
+
+def prune_session_logs(directory, max_age, suffixes=(".jsonl",)):
+    """Delete session logs (files ending in one of suffixes) not written to for max_age seconds"""
+    cutoff = time.time() - max_age
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(tuple(suffixes)) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+    except OSError:
+        pass
+
+
+class SessionHistory:
+    """Q&A history of one session in constant memory
+
+    The newest memory_size entries are kept in a ring buffer; older ones are appended
+    to the session's JSON lines log in directory as they fall out (or dropped when no
+    directory is configured). Running totals are updated on every append, so the
+    dashboard never has to scan the history.
+    """
+
+    def __init__(self, memory_size=config.SESSION_HISTORY_MEMORY, directory=config.SESSION_LOG_DIR):
+        self.session_id = uuid.uuid4().hex
+        self.directory = directory
+        self._recent = deque(maxlen=memory_size)
+        self.count = 0
+        self.spilled = 0
+        self.answer_words = 0
+        self.scopes = {}
+        self.first_at = None
+        if directory:
+            prune_session_logs(directory, config.SESSION_LOG_MAX_AGE_SECONDS)
+
+    @property
+    def log_path(self):
+        return os.path.join(self.directory, f"{self.session_id}.jsonl") if self.directory else None
+
+    def append(self, question, answer, scope="document"):
+        """Record a question and its answer; returns the new HistoryEntry"""
+        entry = HistoryEntry(question, answer, scope)
+        if len(self._recent) == self._recent.maxlen:
+            self._spill(self._recent[0])
+        self._recent.append(entry)
+        self.count += 1
+        self.answer_words += len(answer.split())
+        self.scopes[scope] = self.scopes.get(scope, 0) + 1
+        if self.first_at is None:
+            self.first_at = entry.timestamp
+        return entry
+
+    def _spill(self, entry):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry.to_dict()) + "\n")
+            self.spilled += 1
+        except OSError as e:
+            print(f"Could not write session history log: {e}")
+
+    def recent(self, n=config.SESSION_HISTORY_LIMIT):
+        """The last n entries in memory, newest first"""
+        return list(reversed(self._recent))[:n]
+
+    def __iter__(self):
+        """Every entry still available, oldest first: the on-disk log, then memory"""
+        if self.spilled:
+            try:
+                with open(self.log_path, encoding="utf-8") as f:
+                    for line in f:
+                        yield HistoryEntry(**json.loads(line))
+            except OSError as e:
+                print(f"Could not read session history log: {e}")
+        yield from list(self._recent)
+
+    def __len__(self):
+        return self.count
+
+    def summary(self):
+        """Running totals for the dashboard"""
+        return {
+            'questions': self.count,
+            'on_disk': self.spilled,
+            'library_questions': self.scopes.get("library", 0),
+            'average_answer_words': self.answer_words / self.count if self.count else 0,
+            'first_at': self.first_at,
+            'last_at': self._recent[-1].timestamp if self._recent else None,
+        }
@@ -0,0 +1,129 @@
+"""
+Incremental document ingestion: decode an upload piece by piece, updating metrics as it goes
+"""
+import codecs
+import os
+
+import config
+from documents import Document
+from extraction import iter_pdf_pages
+from storage import StringTableWriter
+
+
+class IncrementalMetrics:
+    """Character, word and sentence counts updated one piece of text at a time
+
+    The totals match Document's counts over the joined text.
+    """
+
+    def __init__(self):
+        self.characters = 0
+        self.words = 0
+        self.periods = 0
+        self._in_word = False
+
+    def update(self, text):
+        if not text:
+            return
+        self.characters += len(text)
+        words = len(text.split())
+        # A word cut in two by the piece boundary is only counted once
+        if words and self._in_word and not text[0].isspace():
+            words -= 1
+        self.words += words
+        self.periods += text.count('.')
+        self._in_word = not text[-1].isspace()
+
+    def snapshot(self):
+        return {
+            'characters': self.characters,
+            'words': self.words,
+            'sentences': self.periods + 1,
+        }
+
+
+class Progress:
+    """One step of ingestion: the text just decoded and how far along the upload is"""
+
+    def __init__(self, text, done, total, metrics):
+        self.text = text
+        self.done = done
+        self.total = total
+        self.metrics = metrics
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 1.0
+
+
+class PageList:
+    """In-memory stand-in for storage.StringTableWriter when pages are not written to files"""
+
+    def __init__(self):
+        self.pages = []
+        self._current = []
+
+    def append(self, text):
+        self._current.append(text)
+
+    def end(self):
+        self.pages.append("".join(self._current))
+        self._current = []
+
+    def close(self):
+        return self.pages
+
+
+def iter_segments(data, file_type):
+    """Yield (text, starts_page, failed, done, total) as the upload is decoded"""
+    if file_type == "application/pdf":
+        for number, page_count, text, failed in iter_pdf_pages(data):
+            yield text, True, failed, number + 1, page_count
+        return
+
+    # Plain text is one page, decoded in blocks so progress and consumers start early
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    block = config.INGEST_BLOCK_BYTES
+    total = len(data)
+    for start in range(0, total, block):
+        final = start + block >= total
+        yield decoder.decode(data[start:start + block], final=final), start == 0, False, min(start + block, total), total
+    if total == 0:
+        yield "", True, False, 0, 0
+
+
+def ingest(data, file_type, key=None, name=None, consumers=(), directory=None):
+    """Generator over an upload's pieces; yields Progress and returns the finished Document
+
+    Each consumer is called with every piece of text in document order (page separators
+    included), so downstream stages such as the chunk index can start on early pages.
+    With a directory, pages are written to directory/pages as they are decoded and the
+    Document is memory-mapped from there, so no piece is kept in memory.
+    """
+    metrics = IncrementalMetrics()
+    writer = StringTableWriter(os.path.join(directory, "pages")) if directory else PageList()
+    page_offsets = []
+    failed_pages = []
+    length = 0
+    for text, starts_page, failed, done, total in iter_segments(data, file_type):
+        pieces = [text]
+        if starts_page:
+            if page_offsets:
+                writer.end()
+                pieces.insert(0, "\n")
+                length += 1
+            page_offsets.append(length)
+            if failed:
+                failed_pages.append(len(page_offsets) - 1)
+        writer.append(text)
+        for piece in pieces:
+            metrics.update(piece)
+            for consumer in consumers:
+                consumer(piece)
+        length += len(text)
+        yield Progress(text, done, total, metrics.snapshot())
+
+    if not page_offsets:
+        page_offsets.append(0)
+    writer.end()
+    return Document(key, None, page_offsets, name, failed_pages, metrics.snapshot(), pages=writer.close())
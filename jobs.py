@@ -0,0 +1,105 @@
+"""
+Background job queue for long document analyses, shared by all sessions in the process
+"""
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+
+class Job:
+    """One analysis of one document; status is queued, running, done or failed"""
+
+    def __init__(self, key):
+        self.key = key
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        # Text produced so far by streaming operations
+        self.partial = ""
+        self.submitted = time.time()
+        self.started = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def elapsed(self):
+        """Seconds since the job started running (or was queued, if it has not yet)"""
+        return (self.finished_at or time.time()) - (self.started or self.submitted)
+
+
+class JobQueue:
+    """Runs analyses on a thread pool so they survive reruns and page switches
+
+    Jobs are keyed by (document hash, operation, parameters). Submitting a key that is
+    queued or running returns the existing job, so any number of sessions asking for the
+    same analysis at the same time share one run; a finished key runs again (repeat
+    results come from the response cache). Finished jobs are kept, up to max_finished,
+    for sessions that come back for the result later.
+    """
+
+    def __init__(self, workers=config.JOB_WORKERS, max_finished=config.JOB_HISTORY_SIZE):
+        self.workers = workers
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def submit(self, doc_hash, operation, fn, *args, **params):
+        """Run fn(*args, **params) in the background unless the same job is pending; return the Job"""
+        key = (doc_hash, operation, tuple(sorted(params.items())))
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.finished:
+                self._jobs.move_to_end(key)
+                return job
+            job = self._jobs[key] = Job(key)
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis-job")
+            self._trim()
+        self._pool.submit(self._run, job, fn, args, params)
+        return job
+
+    def _run(self, job, fn, args, params):
+        job.started = time.time()
+        job.status = "running"
+        try:
+            result = fn(*args, **params)
+            if inspect.isgenerator(result):
+                # Streaming operations publish their text as it arrives
+                for fragment in result:
+                    job.partial += fragment
+                result = job.partial
+            job.result = result
+            job.status = "done"
+        except Exception as e:
+            print(f"Job {job.key[1]} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        job.finished_at = time.time()
+
+    def _trim(self):
+        """Forget the oldest finished jobs over the limit; pending jobs are never dropped"""
+        finished = [key for key, job in self._jobs.items() if job.finished]
+        for key in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[key]
+
+    def get(self, key):
+        """Return the job for a key, or None if it was never submitted or has been forgotten"""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def stats(self):
+        with self._lock:
+            counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+
+job_queue = JobQueue()
@@ -0,0 +1,135 @@
+"""
+Usage counters shared by all sessions: in-process increments, batched flushes to SQLite (WAL)
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import config
+from storage import connect_sqlite
+
+
+class MetricsStore:
+    """Atomic counters with a cached read path
+
+    increment() only touches an in-memory dict. A background thread adds the pending
+    deltas to the database every flush_interval seconds in one transaction, so several
+    server processes can share the file without losing updates.
+    """
+
+    def __init__(self, path=config.METRICS_DB_PATH, flush_interval=config.METRICS_FLUSH_SECONDS,
+                 read_ttl=config.METRICS_READ_TTL_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.read_ttl = read_ttl
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = None
+        self._snapshot = None
+        self._snapshot_at = 0.0
+        self._flusher = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO meta (key, value) VALUES ('start_time', ?)",
+                    (datetime.now().isoformat(),)
+                )
+                self._import_legacy_file(conn)
+            self._conn = conn
+        return self._conn
+
+    def _import_legacy_file(self, conn):
+        """Carry counts over from the old analytics.json the first time the database is created"""
+        if conn.execute("SELECT COUNT(*) FROM counters").fetchone()[0] or not os.path.exists(config.ANALYTICS_FILE):
+            return
+        try:
+            with open(config.ANALYTICS_FILE, 'r') as f:
+                legacy = json.load(f)
+        except Exception as e:
+            print(f"Error loading {config.ANALYTICS_FILE}: {e}")
+            return
+        for name, value in legacy.items():
+            if isinstance(value, int):
+                conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES (?, ?)", (name, value))
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="metrics-flush", daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def increment(self, name, amount=1):
+        """Add amount to a counter without touching the disk"""
+        with self._lock:
+            self._pending[name] = self._pending.get(name, 0) + amount
+            self._start_flusher()
+
+    def flush(self):
+        """Write pending increments to the database in a single transaction"""
+        with self._db_lock:
+            with self._lock:
+                batch = dict(self._pending)
+            if not batch:
+                return
+            try:
+                conn = self._connect()
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO counters (name, value) VALUES (?, ?) "
+                        "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                        list(batch.items())
+                    )
+            except sqlite3.Error as e:
+                # The increments stay pending and are retried on the next flush
+                print(f"Error saving metrics: {e}")
+                return
+            # Move the written amounts from pending into the cached snapshot in one step
+            with self._lock:
+                for name, amount in batch.items():
+                    remaining = self._pending.get(name, 0) - amount
+                    if remaining:
+                        self._pending[name] = remaining
+                    else:
+                        self._pending.pop(name, None)
+                    if self._snapshot is not None:
+                        self._snapshot[name] = self._snapshot.get(name, 0) + amount
+
+    def snapshot(self):
+        """Counters plus 'start_time', re-read from disk at most every read_ttl seconds"""
+        now = time.time()
+        if self._snapshot is None or now - self._snapshot_at > self.read_ttl:
+            try:
+                with self._db_lock:
+                    conn = self._connect()
+                    values = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+                    values.update(conn.execute("SELECT key, value FROM meta").fetchall())
+                    with self._lock:
+                        self._snapshot = values
+                        self._snapshot_at = now
+            except sqlite3.Error as e:
+                print(f"Error loading metrics: {e}")
+        # Include this process's unflushed increments so a session sees its own actions at once
+        with self._lock:
+            values = dict(self._snapshot or {})
+            for name, amount in self._pending.items():
+                values[name] = values.get(name, 0) + amount
+        return values
+
+
+metrics_store = MetricsStore()
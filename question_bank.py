@@ -0,0 +1,134 @@
+"""
+Question bank: a pool of challenge questions per document, with reference answers and source spans (SQLite)
+"""
+import re
+import threading
+import time
+
+import config
+from storage import connect_sqlite
+
+
+def locate(document, quote, max_words=12):
+    """(page, start, end) of quote in document's page texts, matching across whitespace, or None"""
+    words = quote.split()[:max_words]
+    if not words:
+        return None
+    pattern = re.compile(r"\s+".join(re.escape(word) for word in words), re.IGNORECASE)
+    for page in range(len(document.page_offsets)):
+        match = pattern.search(document.page_text(page))
+        if match:
+            return page, match.start(), match.end()
+    return None
+
+
+class QuestionBank:
+    """Generated questions stored per (document hash, model) and shared by all sessions
+
+    A document's pool is built once, normally in the background right after ingestion.
+    sample() hands out the questions served least often so far, so sessions working on
+    the same document see different questions until the pool has gone round.
+    """
+
+    COLUMNS = "id, question, answer, source, source_page, source_start, source_end"
+
+    def __init__(self, path=config.QUESTION_BANK_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self._conn = None
+        # (doc_hash, model) pairs known to have a pool, so ready() rarely queries
+        self._ready = set()
+
+    def _connect(self):
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS questions ("
+                "doc_hash TEXT NOT NULL, model TEXT NOT NULL, id INTEGER NOT NULL, question TEXT NOT NULL, "
+                "answer TEXT NOT NULL, source TEXT NOT NULL, source_page INTEGER, source_start INTEGER, "
+                "source_end INTEGER, served INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL, "
+                "PRIMARY KEY (doc_hash, model, id))"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def ready(self, doc_hash, model):
+        """Does the document have a question pool for this model?"""
+        if (doc_hash, model) in self._ready:
+            return True
+        with self._lock:
+            found = self._connect().execute(
+                "SELECT 1 FROM questions WHERE doc_hash = ? AND model = ? LIMIT 1", (doc_hash, model)
+            ).fetchone() is not None
+        if found:
+            self._ready.add((doc_hash, model))
+        return found
+
+    def build(self, document, model, generate):
+        """Store the pool generate(document) returns, unless the document already has one
+
+        generate returns dicts with 'question', 'answer' and 'source' (a quote from the
+        document). Concurrent builds of the same document run generate only once.
+        """
+        key = (document.content_hash, model)
+        with self._lock:
+            lock = self._build_locks.setdefault(key, threading.Lock())
+        with lock:
+            if self.ready(*key):
+                return False
+            rows = []
+            for number, item in enumerate(generate(document)):
+                span = locate(document, item['source']) if item['source'] else None
+                rows.append((document.content_hash, model, number, item['question'], item['answer'],
+                             item['source'], *(span or (None, None, None)), time.time()))
+            if not rows:
+                return False
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO questions (doc_hash, model, id, question, answer, source, "
+                        "source_page, source_start, source_end, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+            self._ready.add(key)
+            return True
+
+    def sample(self, doc_hash, model, n, exclude=()):
+        """n questions as dicts, least served first and none from exclude unless the pool runs out"""
+        exclude = list(exclude)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                # Skip the ids a session has already seen: a sort key, so they still fill up a short pool
+                rows = conn.execute(
+                    f"SELECT {self.COLUMNS} FROM questions WHERE doc_hash = ? AND model = ? "
+                    f"ORDER BY id IN ({','.join('?' * len(exclude))}), served, random() LIMIT ?",
+                    (doc_hash, model, *exclude, n)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE questions SET served = served + 1 WHERE doc_hash = ? AND model = ? AND id = ?",
+                    [(doc_hash, model, row[0]) for row in rows]
+                )
+        names = [name.strip() for name in self.COLUMNS.split(",")]
+        return [dict(zip(names, row)) for row in rows]
+
+    def remove(self, doc_hash):
+        """Forget a document's questions, for every model"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM questions WHERE doc_hash = ?", (doc_hash,))
+        self._ready = {key for key in self._ready if key[0] != doc_hash}
+
+    def stats(self):
+        with self._lock:
+            documents, questions, served = self._connect().execute(
+                "SELECT COUNT(DISTINCT doc_hash), COUNT(*), COALESCE(SUM(served), 0) FROM questions"
+            ).fetchone()
+        return {'documents': documents, 'questions': questions, 'served': served}
+
+
+question_bank = QuestionBank()
@@ -0,0 +1,246 @@
+"""
+Local BM25 chunk index for retrieval-augmented Q&A
+"""
+import os
+import re
+from collections import Counter
+from itertools import chain
+
+import numpy as np
+
+import config
+from context_budget import SECTION_SEPARATOR, estimate_tokens
+from storage import StringTable
+
+# Letters and digits in any script (underscores separate words, as in the library's FTS5 index)
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+# Bumped whenever tokenize() changes, so indexes saved by an older version are rebuilt
+TOKENIZER_VERSION = 2
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def tokenize(text):
+    """Lowercase word tokens used for indexing and querying"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class Chunker:
+    """Incrementally group text into roughly chunk_size character chunks on sentence boundaries"""
+
+    def __init__(self, chunk_size=config.CHUNK_SIZE, overlap=config.CHUNK_OVERLAP):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self._pending = ""
+        self._current = []
+        self._length = 0
+
+    def feed(self, text):
+        """Add more text and return the chunks completed by it"""
+        self._pending = re.sub(r"\s+", " ", self._pending + text).lstrip()
+        sentences = SENTENCE_END.split(self._pending)
+        # The last piece may be an unfinished sentence that continues in the next feed
+        self._pending = sentences.pop()
+        while len(self._pending) > self.chunk_size:
+            sentences.append(self._pending[:self.chunk_size])
+            self._pending = self._pending[self.chunk_size:]
+        return self._add(sentences)
+
+    def finish(self):
+        """Flush the remaining text and return the final chunks"""
+        pending = self._pending.strip()
+        self._pending = ""
+        chunks = self._add([pending] if pending else [])
+        if self._current:
+            chunks.append(" ".join(self._current))
+            self._current = []
+            self._length = 0
+        return chunks
+
+    def _add(self, sentences):
+        chunks = []
+        for text in sentences:
+            # Text without punctuation (tables, OCR output) is cut into fixed-size pieces
+            for sentence in (text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)):
+                if self._current and self._length + len(sentence) > self.chunk_size:
+                    chunks.append(" ".join(self._current))
+                    # Carry trailing sentences over so answers spanning a boundary stay retrievable
+                    carried = []
+                    carried_length = 0
+                    for previous in reversed(self._current):
+                        if carried_length + len(previous) > self.overlap:
+                            break
+                        carried.insert(0, previous)
+                        carried_length += len(previous) + 1
+                    self._current = carried
+                    self._length = carried_length
+                self._current.append(sentence)
+                self._length += len(sentence) + 1
+        return chunks
+
+
+def split_chunks(text, chunk_size=config.CHUNK_SIZE, overlap=config.CHUNK_OVERLAP):
+    """Split text into roughly chunk_size character chunks on sentence boundaries"""
+    chunker = Chunker(chunk_size, overlap)
+    return chunker.feed(text) + chunker.finish()
+
+
+class SortedTerms:
+    """Read-only term -> row mapping over a sorted fixed-width byte array (memory-mapped)"""
+
+    def __init__(self, keys, rows):
+        self.keys = keys
+        self.rows = rows
+
+    @staticmethod
+    def write(path, terms):
+        """Write a term -> row dict as path.keys.npy and path.rows.npy"""
+        # Sorted by encoded bytes, the order searchsorted compares fixed-width byte strings in
+        ordered = sorted((term.encode("utf-8"), row) for term, row in terms.items())
+        width = max((len(key) for key, _ in ordered), default=1)
+        np.save(path + ".keys.npy", np.array([key for key, _ in ordered], dtype=f"S{width}"))
+        np.save(path + ".rows.npy", np.array([row for _, row in ordered], dtype=np.int64))
+
+    @classmethod
+    def open(cls, path):
+        return cls(np.load(path + ".keys.npy", mmap_mode="r"), np.load(path + ".rows.npy", mmap_mode="r"))
+
+    def get(self, term):
+        key = term.encode("utf-8")
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return int(self.rows[i])
+        return None
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class ChunkIndex:
+    """BM25 index over the chunks of a single document
+
+    ChunkIndex(text) builds a searchable index at once. ChunkIndex() starts an empty index
+    that is filled page by page with feed() and made searchable with finish(). Postings
+    are kept in flat arrays (one slice per term), so a finished index can be saved and
+    memory-mapped back with load().
+    """
+
+    ARRAYS = ("post_offsets", "post_ids", "post_tfs", "idf", "lengths")
+
+    def __init__(self, text=None, chunk_size=config.CHUNK_SIZE, overlap=config.CHUNK_OVERLAP, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks = []
+        # term -> row; the postings of row r are post_ids/post_tfs[post_offsets[r]:post_offsets[r + 1]]
+        self.terms = {}
+        self.post_offsets = np.zeros(1, dtype=np.int64)
+        self.post_ids = np.zeros(0, dtype=np.int32)
+        self.post_tfs = np.zeros(0, dtype=np.float32)
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.lengths = np.zeros(0, dtype=np.float32)
+        self.avg_length = 0.0
+        self._chunker = Chunker(chunk_size, overlap)
+        self._postings = {}
+        self._lengths = []
+        if text is not None:
+            self.feed(text)
+            self.finish()
+
+    def feed(self, text):
+        """Index the chunks completed by another piece of document text"""
+        for chunk in self._chunker.feed(text):
+            self._add_chunk(chunk)
+
+    def _add_chunk(self, chunk):
+        chunk_id = len(self.chunks)
+        self.chunks.append(chunk)
+        counts = Counter(tokenize(chunk))
+        self._lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            ids, tfs = self._postings.setdefault(term, ([], []))
+            ids.append(chunk_id)
+            tfs.append(tf)
+
+    def finish(self):
+        """Flush the last chunk and compute the BM25 statistics"""
+        for chunk in self._chunker.finish():
+            self._add_chunk(chunk)
+
+        n = len(self.chunks)
+        postings = list(self._postings.values())
+        df = np.array([len(ids) for ids, _ in postings], dtype=np.int64)
+        self.terms = {term: row for row, term in enumerate(self._postings)}
+        self.post_offsets = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+        self.post_ids = np.fromiter(chain.from_iterable(ids for ids, _ in postings), dtype=np.int32, count=int(df.sum()))
+        self.post_tfs = np.fromiter(chain.from_iterable(tfs for _, tfs in postings), dtype=np.float32, count=int(df.sum()))
+        self.idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.lengths = np.array(self._lengths, dtype=np.float32)
+        self.avg_length = float(self.lengths.mean()) if n else 0.0
+        self._postings = {}
+        self._lengths = []
+        return self
+
+    def save(self, directory):
+        """Write a finished index as string tables and .npy arrays"""
+        StringTable.write(os.path.join(directory, "chunks"), self.chunks)
+        SortedTerms.write(os.path.join(directory, "terms"), self.terms)
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, name + ".npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory):
+        """Open an index written by save(); chunks and postings stay memory-mapped"""
+        index = cls()
+        index.chunks = StringTable.open(os.path.join(directory, "chunks"))
+        index.terms = SortedTerms.open(os.path.join(directory, "terms"))
+        for name in cls.ARRAYS:
+            setattr(index, name, np.load(os.path.join(directory, name + ".npy"), mmap_mode="r"))
+        index.avg_length = float(index.lengths.mean()) if len(index.chunks) else 0.0
+        return index
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query, top_k=config.RETRIEVAL_TOP_K):
+        """Return (chunk_id, score) pairs for the best matching chunks, best first"""
+        if not self.chunks:
+            return []
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.avg_length, 1.0))
+        for term in set(tokenize(query)):
+            row = self.terms.get(term)
+            if row is None:
+                continue
+            start, stop = self.post_offsets[row], self.post_offsets[row + 1]
+            ids = self.post_ids[start:stop]
+            tfs = self.post_tfs[start:stop]
+            scores[ids] += self.idf[row] * tfs * (self.k1 + 1) / (tfs + norm[ids])
+
+        top_k = min(top_k, len(self.chunks))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(i), float(scores[i])) for i in best if scores[i] > 0]
+
+    def context_for(self, query, top_k=config.RETRIEVAL_TOP_K, max_tokens=None):
+        """Join the best matching chunks in document order, falling back to the opening chunks"""
+        return self.context_for_queries([query], top_k, max_tokens)
+
+    def context_for_queries(self, queries, top_k=config.RETRIEVAL_TOP_K, max_tokens=None):
+        """Join the union of the best chunks for several queries, each chunk sent once
+
+        With max_tokens, chunks are taken in order of relevance until the budget is spent.
+        """
+        ranked = []
+        for query in queries:
+            ranked.extend(i for i, _ in self.search(query, top_k) if i not in ranked)
+        ranked = ranked or list(range(min(top_k, len(self.chunks))))
+        if max_tokens is not None:
+            chosen = []
+            used = 0
+            for i in ranked:
+                cost = estimate_tokens(self.chunks[i])
+                if chosen and used + cost > max_tokens:
+                    continue
+                chosen.append(i)
+                used += cost
+            ranked = chosen
+        return SECTION_SEPARATOR.join(self.chunks[i] for i in sorted(ranked))
@@ -0,0 +1,219 @@
+"""
+Shared request scheduler for model calls: adaptive token bucket, retry with backoff, single-flight
+"""
+import random
+import threading
+import time
+
+import config
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+                    "DeadlineExceeded", "GatewayTimeout", "BadGateway"}
+
+
+def status_code(error):
+    """HTTP status of an API error if it carries one (google.api_core errors do)"""
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error):
+    return status_code(error) in RETRYABLE_STATUS_CODES or type(error).__name__ in RETRYABLE_ERRORS
+
+
+class TokenBucket:
+    """Token bucket that adapts its rate: halved on rate-limit errors, recovered on success
+
+    requests_per_minute=0 (or less) means no rate limit.
+    """
+
+    def __init__(self, requests_per_minute=config.RATE_LIMIT_RPM, burst=config.RATE_LIMIT_BURST):
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = self.max_rate / 16
+        self.rate = self.max_rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent; callers are served in arrival order"""
+        if self.max_rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve a token even if it is not there yet; the deficit is the wait
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def throttled(self):
+        """The quota was exceeded: slow down"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        """Recover additively towards the configured rate"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _StreamFlight:
+    """Fragments of a shared stream so far; followers wait on changed for more"""
+
+    def __init__(self):
+        self.changed = threading.Condition()
+        self.fragments = []
+        self.finished = False
+        self.error = None
+        self.followers = 0
+
+    def add(self, fragment):
+        with self.changed:
+            self.fragments.append(fragment)
+            self.changed.notify_all()
+
+    def finish(self, error=None):
+        with self.changed:
+            self.finished = True
+            self.error = error
+            self.changed.notify_all()
+
+
+class RequestScheduler:
+    """Rate-limits, retries and deduplicates calls to the model backend"""
+
+    def __init__(self, bucket=None, max_attempts=config.RETRY_MAX_ATTEMPTS,
+                 base_delay=config.RETRY_BASE_DELAY, max_delay=config.RETRY_MAX_DELAY):
+        self.bucket = bucket or TokenBucket()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._flights = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'coalesced': 0, 'retries': 0, 'throttled': 0}
+
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn, *args):
+        """Run fn(*args) under the rate limit, retrying 429/5xx errors with backoff"""
+        for attempt in range(self.max_attempts):
+            self.bucket.acquire()
+            try:
+                result = fn(*args)
+                self.bucket.succeeded()
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_attempts - 1:
+                    raise
+                throttled = status_code(e) == 429 or type(e).__name__ in ("ResourceExhausted", "TooManyRequests")
+                if throttled:
+                    self.bucket.throttled()
+                with self._lock:
+                    self.stats['retries'] += 1
+                    self.stats['throttled'] += throttled
+                time.sleep(self.backoff(attempt))
+
+    def run(self, key, fn, *args):
+        """Like call(), but concurrent calls with the same key share one in-flight request"""
+        with self._lock:
+            self.stats['calls'] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self.call(fn, *args)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stream(self, key, fn, *args):
+        """Like run() for streams: fn(*args) returns an iterator of fragments
+
+        The first caller drives the upstream stream (opened through call(), so retries
+        cover opening it); concurrent callers with the same key replay its fragments as
+        they arrive instead of sending the prompt again.
+        """
+        with self._lock:
+            self.stats['calls'] += 1
+            flight = self._streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._streams[key] = _StreamFlight()
+            else:
+                self.stats['coalesced'] += 1
+                flight.followers += 1
+        if leader:
+            return self._lead(key, flight, fn, args)
+        return self._follow(flight)
+
+    def _lead(self, key, flight, fn, args):
+        error = None
+        complete = False
+        fragments = iter(())
+        try:
+            fragments = self.call(fn, *args)
+            for fragment in fragments:
+                flight.add(fragment)
+                yield fragment
+            complete = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # No caller can join once the flight is unlisted
+            with self._lock:
+                del self._streams[key]
+                followers = flight.followers
+            if error is None and not complete and followers:
+                # Closed early by its own caller: finish the stream for the callers sharing it
+                try:
+                    for fragment in fragments:
+                        flight.add(fragment)
+                except Exception as e:
+                    error = e
+            flight.finish(error)
+
+    def _follow(self, flight):
+        seen = 0
+        while True:
+            with flight.changed:
+                flight.changed.wait_for(lambda: len(flight.fragments) > seen or flight.finished)
+                fresh = flight.fragments[seen:]
+                finished = flight.finished
+            seen += len(fresh)
+            yield from fresh
+            if finished:
+                if flight.error is not None:
+                    raise flight.error
+                return
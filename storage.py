@@ -0,0 +1,93 @@
+"""
+On-disk storage: compact string tables (UTF-8 blob + offset array) read through mmap, and SQLite connections
+"""
+import mmap
+import os
+import sqlite3
+
+import numpy as np
+
+
+class StringTable:
+    """Read-only sequence of strings stored as one UTF-8 blob and an int64 offset array
+
+    Both files are memory-mapped, so opening a table costs almost nothing and the bytes
+    live in the OS page cache, shared by every session and process that reads them.
+    Strings are decoded only when accessed.
+    """
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    @staticmethod
+    def write(path, strings):
+        """Write strings to path.utf8 and path.offsets.npy"""
+        writer = StringTableWriter(path)
+        for string in strings:
+            writer.append(string)
+            writer.end()
+        writer.close()
+
+    @classmethod
+    def open(cls, path):
+        """Map a table written by write()"""
+        offsets = np.load(path + ".offsets.npy", mmap_mode="r")
+        with open(path + ".utf8", "rb") as f:
+            # An empty file cannot be mapped; every string in it is empty anyway
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        return cls(blob, offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError("string table index out of range")
+        i %= len(self)
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class StringTableWriter:
+    """Write a StringTable piece by piece, so a long string never has to be held whole
+
+    append() adds text to the current string and end() finishes it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path + ".utf8", "wb")
+        self._offsets = [0]
+        self._size = 0
+
+    def append(self, text):
+        data = text.encode("utf-8")
+        self._file.write(data)
+        self._size += len(data)
+
+    def end(self):
+        self._offsets.append(self._size)
+
+    def close(self):
+        """Write the offsets and return the finished table, memory-mapped"""
+        self._file.close()
+        np.save(self.path + ".offsets.npy", np.array(self._offsets, dtype=np.int64))
+        return StringTable.open(self.path)
+
+
+def connect_sqlite(path, timeout=10):
+    """SQLite connection in WAL mode, usable from any thread; creates the file's directory
+
+    Readers do not block the writer in WAL mode, and a locked database is retried for
+    timeout seconds, so several sessions and processes can share one file.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
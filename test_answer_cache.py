@@ -0,0 +1,30 @@
+"""
+Tests for the shared answer cache: exact and near-duplicate questions and the question guard
+"""
+from answer_cache import AnswerCache, normalize_question, question_guard
+
+
+def guard(question):
+    return question_guard(normalize_question(question))
+
+
+def test_guard_separates_numbers_negations_and_identifiers():
+    assert guard("What does section 3 say?") != guard("What does section 4 say?")
+    assert guard("Does the paper mention GPUs?") != guard("Doesn't the paper mention GPUs?")
+    assert guard("How does model A perform?") != guard("How does model B perform?")
+    # Rewording and common short words leave the guard alone
+    assert guard("What is it about?") == guard("What, in short, is it about?")
+
+
+def test_similar_questions_share_an_answer_unless_the_guard_differs(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), threshold=0.8)
+    cache.set("doc", "model", "What results does section 3 report?", "Accuracy of 91%.")
+
+    assert cache.get("doc", "model", "what results does section 3 report") == (
+        "Accuracy of 91%.", "What results does section 3 report?"
+    )
+    assert cache.get("doc", "model", "What results does section 3 report, please?")[0] == "Accuracy of 91%."
+    assert cache.get("doc", "model", "What results does section 4 report?") is None
+    assert cache.get("doc", "model", "What results does section 3 not report?") is None
+    assert cache.get("other doc", "model", "What results does section 3 report?") is None
+    assert cache.exact_hits == 1 and cache.similar_hits == 1
@@ -0,0 +1,52 @@
+"""
+Tests for the response cache's disk tier: size accounting and least-recently-used eviction
+"""
+import sqlite3
+
+from cache import ResponseCache
+
+
+def disk_totals(cache):
+    conn = cache._connect()
+    tracked = conn.execute("SELECT size, entries FROM response_totals").fetchone()
+    actual = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses").fetchone()
+    assert tracked == actual
+    return tracked
+
+
+def test_least_recently_used_entries_are_evicted_over_the_size_limit(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), memory_entries=0, max_disk_bytes=1000)
+    for n in range(10):
+        cache.set(f"key{n}", "x" * 100)
+    assert disk_totals(cache) == (1000, 10)
+
+    # Reading key0 makes key1 the least recently used entry
+    assert cache.get("key0") == "x" * 100
+    cache.set("key10", "y" * 250)
+    assert disk_totals(cache) == (950, 8)
+    assert cache.get("key0") is not None
+    assert cache.get("key1") is None and cache.get("key2") is None and cache.get("key3") is None
+
+    # Replacing an entry adjusts the totals by the size difference
+    cache.set("key10", "z" * 50)
+    assert disk_totals(cache) == (750, 8)
+    cache.clear()
+    assert disk_totals(cache) == (0, 0)
+
+
+def test_cache_created_before_the_totals_table_is_counted(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+        "created REAL NOT NULL, accessed REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO responses VALUES ('old', 'abc', 3, 1e12, 1e12)")
+    conn.commit()
+    conn.close()
+
+    cache = ResponseCache(path, ttl=1e13)
+    assert disk_totals(cache) == (3, 1)
+    cache.set("new", "abcd")
+    assert disk_totals(cache) == (7, 2)
+    assert ResponseCache(path, ttl=1e13).get("old") == "abc"
@@ -0,0 +1,36 @@
+"""
+Tests for token budgets: whole sentences, section coverage and oversized sentences
+"""
+from context_budget import SECTION_SEPARATOR, estimate_tokens, fill_budget
+
+# 100 sentences of 40 characters (10 tokens, 11 with the separating space)
+SENTENCES = [f"Sentence {n:03d} is about the topic at hand." for n in range(100)]
+
+
+def test_document_within_budget_is_sent_whole():
+    context, coverage = fill_budget(SENTENCES[:10], budget=200)
+    assert context == " ".join(SENTENCES[:10])
+    assert coverage['complete'] and coverage['sentences'] == 10
+
+
+def test_budget_takes_whole_leading_sentences():
+    context, coverage = fill_budget(SENTENCES, budget=110)
+    assert context == " ".join(SENTENCES[:10])
+    assert estimate_tokens(context) <= 110
+    assert not coverage['complete'] and coverage['sentences'] == 10 and coverage['total_sentences'] == 100
+
+
+def test_sections_cover_the_whole_document():
+    context, coverage = fill_budget(SENTENCES, budget=220, sections=4)
+    parts = context.split(SECTION_SEPARATOR)
+    assert coverage['sections'] == 4
+    # Each quarter of the document contributes its opening sentences
+    assert [part.split(" ", 2)[1] for part in parts] == ["000", "025", "050", "075"]
+    assert all(len(part.split(". ")) == 5 for part in parts)
+
+
+def test_oversized_sentence_is_cut_at_a_word():
+    table = " ".join(f"cell{n}" for n in range(500))
+    context, coverage = fill_budget([table], budget=50)
+    assert table.startswith(context) and table[len(context)] == " "
+    assert estimate_tokens(context) <= 50
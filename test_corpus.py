@@ -0,0 +1,41 @@
+"""
+Tests for the document library: schema migration and background job bookkeeping
+"""
+import sqlite3
+
+from corpus import Corpus
+from documents import Document
+
+
+def test_old_library_loses_its_text_column_and_keeps_its_documents(tmp_path):
+    path = str(tmp_path / "corpus.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE documents (doc_hash TEXT PRIMARY KEY, name TEXT NOT NULL, text TEXT NOT NULL, "
+        "pages INTEGER NOT NULL, chunks INTEGER NOT NULL, words INTEGER NOT NULL, added REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO documents VALUES ('old', 'old.pdf', 'the whole text', 3, 0, 3, 1.0)")
+    conn.commit()
+    conn.close()
+
+    corpus = Corpus(path)
+    assert corpus.documents() == [('old', 'old.pdf', 3, 3)]
+    columns = [row[1] for row in corpus._connect().execute("PRAGMA table_info(documents)")]
+    assert "text" not in columns
+
+    # The migrated library takes new documents and finds them
+    assert corpus.add_document(Document.from_text("Photosynthesis turns light into sugar.", name="new.txt"))
+    assert [passage['name'] for passage in corpus.search("photosynthesis")] == ["new.txt"]
+    # Opening it again does not migrate twice
+    assert len(Corpus(path).documents()) == 2
+
+
+def test_only_the_last_finished_jobs_are_kept(tmp_path):
+    corpus = Corpus(str(tmp_path / "corpus.sqlite3"), max_finished=2)
+    for n in range(5):
+        corpus.jobs[f"done{n}"] = {'name': f"done{n}", 'status': "indexing", 'error': None}
+        corpus._update(f"done{n}", status="done")
+    corpus.jobs["running"] = {'name': "running", 'status': "extracting", 'error': None}
+
+    assert list(corpus.jobs) == ["done3", "done4", "running"]
+    assert corpus.pending() == ["running"]
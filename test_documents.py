@@ -0,0 +1,87 @@
+"""
+Tests for saved document files: page-wise derived values and pruning
+"""
+import os
+import time
+
+from documents import Document, DocumentStore, open_document_files, prune_document_files, save_document_files
+from ingestion import ingest
+
+PAGES = [f"Page {page} first sentence.   Page {page} second\nsentence!" for page in range(5)]
+
+
+def make_document(name="doc"):
+    text = "\n".join(PAGES)
+    offsets = [0]
+    for page in PAGES[:-1]:
+        offsets.append(offsets[-1] + len(page) + 1)
+    return Document(name * 8, text, offsets, name=name)
+
+
+def test_mapped_document_derives_the_same_values(tmp_path):
+    document = make_document()
+    save_document_files(document, str(tmp_path))
+    mapped = open_document_files(document.content_hash, str(tmp_path))
+
+    assert list(mapped.pages()) == PAGES
+    assert mapped.normalized == document.normalized
+    assert mapped.sentences == document.sentences
+    assert mapped.tokens == document.tokens
+    # Whole-text values are rebuilt per operation instead of being kept on a mapped document
+    assert 'normalized' not in mapped._derived and 'sentences' not in mapped._derived
+    assert 'normalized' in document._derived
+
+
+def run(pipeline):
+    while True:
+        try:
+            next(pipeline)
+        except StopIteration as finished:
+            return finished.value
+
+
+def test_ingested_pages_are_written_straight_to_the_store(tmp_path):
+    data = "\n".join(PAGES).encode("utf-8")
+    store = DocumentStore(directory=str(tmp_path))
+    staged = store.stage("doc")
+    document = run(ingest(data, "text/plain", "doc", "doc.txt", directory=staged))
+    assert list(document.pages()) == ["\n".join(PAGES)]
+
+    stored = store.put(document, staged)
+    assert os.listdir(str(tmp_path)) == ["doc"]
+    assert stored.page_text(0) == "\n".join(PAGES)
+    assert stored.metrics['words'] == len(data.split())
+
+
+def save_at(directory, name, used):
+    document = make_document(name)
+    path = save_document_files(document, directory)
+    os.utime(path, (used, used))
+    return document.content_hash
+
+
+def test_prune_deletes_old_documents_first(tmp_path):
+    directory = str(tmp_path)
+    now = time.time()
+    old = save_at(directory, "old", now - 1000)
+    kept = save_at(directory, "kept", now - 900)
+    new = save_at(directory, "new", now)
+
+    prune_document_files(directory, max_bytes=10 ** 9, max_age=500, keep={kept})
+    assert sorted(os.listdir(directory)) == sorted([kept, new])
+
+
+def test_prune_deletes_least_recently_opened_until_under_max_bytes(tmp_path):
+    directory = str(tmp_path)
+    now = time.time()
+    first = save_at(directory, "one", now - 30)
+    second = save_at(directory, "two", now - 20)
+    third = save_at(directory, "six", now - 10)
+    size = sum(entry.stat().st_size for entry in os.scandir(os.path.join(directory, third)))
+
+    prune_document_files(directory, max_bytes=size * 2, max_age=3600)
+    assert sorted(os.listdir(directory)) == sorted([second, third])
+    # Opening a document marks it as used, so it outlives one opened before it
+    open_document_files(second, directory)
+    prune_document_files(directory, max_bytes=size, max_age=3600)
+    assert os.listdir(directory) == [second]
@@ -0,0 +1,44 @@
+"""
+Tests for session event logs: compressed round trips and reading while events are appended
+"""
+import threading
+
+import pytest
+
+from export import SessionLog
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_logged_events_read_back_in_order(tmp_path, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    log = SessionLog("session", directory=str(tmp_path), compression=compression)
+    for n in range(50):
+        log.record("question", question=f"Question {n}?", key_points=["a", "ünïcode"])
+
+    records = list(log.records())
+    assert [record['question'] for record in records] == [f"Question {n}?" for n in range(50)]
+    assert records[0]['key_points'] == ["a", "ünïcode"] and records[0]['event'] == "question"
+    assert len(list(log.records(limit=7))) == 7
+    assert len(log) == 50
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_reading_while_events_are_appended_sees_whole_events(tmp_path, compression):
+    log = SessionLog("session", directory=str(tmp_path), compression=compression)
+    log.record("question", question="first")
+    done = threading.Event()
+
+    def append():
+        for n in range(300):
+            log.record("answer", answer="x" * n)
+        done.set()
+
+    writer = threading.Thread(target=append)
+    writer.start()
+    while not done.is_set():
+        records = list(log.records())
+        assert records[0]['question'] == "first"
+        assert all(record['event'] in ("question", "answer") for record in records)
+    writer.join()
+    assert len(list(log.records())) == 301
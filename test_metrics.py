@@ -0,0 +1,51 @@
+"""
+Tests for the concurrent-safe metrics store
+"""
+import sqlite3
+import threading
+
+from metrics import MetricsStore
+
+
+def test_concurrent_increments_are_not_lost(tmp_path):
+    """100 threads x 1000 increments, flushed while they run, add up to exactly 100000"""
+    path = str(tmp_path / "metrics.db")
+    store = MetricsStore(path, flush_interval=3600, read_ttl=0)
+    start = threading.Event()
+
+    def work():
+        start.wait()
+        for _ in range(1000):
+            store.increment('questions_asked')
+
+    threads = [threading.Thread(target=work) for _ in range(100)]
+    for thread in threads:
+        thread.start()
+    start.set()
+    # Flushes racing the increments must neither drop nor double-count any of them
+    while any(thread.is_alive() for thread in threads):
+        store.flush()
+    for thread in threads:
+        thread.join()
+    store.flush()
+
+    assert store.snapshot()['questions_asked'] == 100000
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT value FROM counters WHERE name = 'questions_asked'").fetchone()[0] == 100000
+    finally:
+        conn.close()
+
+
+def test_stores_sharing_a_file_add_up(tmp_path):
+    """Two stores on one database (as two server processes would be) both keep their counts"""
+    path = str(tmp_path / "metrics.db")
+    first = MetricsStore(path, flush_interval=3600, read_ttl=0)
+    second = MetricsStore(path, flush_interval=3600, read_ttl=0)
+    first.increment('documents_processed', 3)
+    second.increment('documents_processed', 4)
+    first.flush()
+    second.flush()
+
+    assert first.snapshot()['documents_processed'] == 7
+    assert 'start_time' in second.snapshot()
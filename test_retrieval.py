@@ -0,0 +1,50 @@
+"""
+Tests for the BM25 chunk index: incremental indexing, saving and Unicode terms
+"""
+import numpy as np
+
+from retrieval import ChunkIndex
+
+PAGES = [
+    " ".join(f"Page {page} sentence {i} discusses topic {(page * 7 + i) % 11} and result {i % 5}." for i in range(40))
+    for page in range(12)
+] + ["Eine Schlüsselgröße für Übergröße. 東京大学 研究 naïve café. Tables without punctuation " * 30]
+
+QUERIES = ["topic 3", "result 4 topic 10", "page 7 sentence 12", "schlüsselgröße", "東京大学", "café", "unknown"]
+
+
+def assert_same_index(incremental, whole):
+    assert list(incremental.chunks) == list(whole.chunks)
+    assert sorted(incremental.terms.items()) == sorted(whole.terms.items())
+    for name in ChunkIndex.ARRAYS:
+        assert np.array_equal(getattr(incremental, name), getattr(whole, name)), name
+    for query in QUERIES:
+        assert incremental.search(query) == whole.search(query), query
+
+
+def test_feed_and_finish_match_whole_text():
+    """Feeding pages (split anywhere, even mid-word) builds the same index as indexing all text at once"""
+    text = "\n".join(PAGES)
+    whole = ChunkIndex(text, chunk_size=300, overlap=60)
+
+    by_page = ChunkIndex(chunk_size=300, overlap=60)
+    for n, page in enumerate(PAGES):
+        by_page.feed(page if n == 0 else "\n" + page)
+    by_page.finish()
+    assert_same_index(by_page, whole)
+
+    # Odd-sized pieces cut words and sentences apart
+    by_piece = ChunkIndex(chunk_size=300, overlap=60)
+    for start in range(0, len(text), 97):
+        by_piece.feed(text[start:start + 97])
+    by_piece.finish()
+    assert_same_index(by_piece, whole)
+
+
+def test_saved_index_searches_the_same(tmp_path):
+    index = ChunkIndex("\n".join(PAGES), chunk_size=300, overlap=60)
+    index.save(str(tmp_path))
+    loaded = ChunkIndex.load(str(tmp_path))
+    for query in QUERIES:
+        assert loaded.search(query) == index.search(query), query
+    assert loaded.search("schlüsselgröße") and loaded.search("東京大学")
@@ -0,0 +1,165 @@
+"""
+Tests for request coalescing and retries in the request scheduler
+"""
+import threading
+import time
+
+import pytest
+
+from backends import LLMBackend, ScheduledBackend
+from scheduler import RequestScheduler, TokenBucket
+
+
+class ServiceUnavailable(Exception):
+    code = 503
+
+
+def make_scheduler():
+    """A scheduler whose rate limit and backoff never slow a test down"""
+    return RequestScheduler(TokenBucket(requests_per_minute=600000, burst=100), base_delay=0, max_delay=0)
+
+
+class SlowStreamBackend(LLMBackend):
+    """Streams three fragments once release is set, counting the streams it opens"""
+
+    name = "slow"
+    model_name = "slow"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.streams = 0
+
+    def stream(self, prompt):
+        self.streams += 1
+        self.release.wait(5)
+        for word in ("one ", "two ", "three"):
+            yield word
+
+
+def run_concurrently(scheduler, n, key, fn, call=None):
+    """Call scheduler.run(key, fn) (or call()) from n threads at once; returns their results (or errors)"""
+    results = [None] * n
+
+    def work(i):
+        try:
+            results[i] = call() if call else scheduler.run(key, fn)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_for_calls(scheduler, n, timeout=5):
+    deadline = time.time() + timeout
+    while scheduler.stats['calls'] < n and time.time() < deadline:
+        time.sleep(0.001)
+
+
+def test_identical_concurrent_prompts_make_one_backend_call():
+    s = make_scheduler()
+    release = threading.Event()
+    backend_calls = []
+
+    def generate():
+        backend_calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    threads, results = run_concurrently(s, 10, "same prompt", generate)
+    # Hold the first request open until every caller has joined it
+    wait_for_calls(s, 10)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(backend_calls) == 1
+    assert results == ["answer"] * 10
+    assert s.stats['coalesced'] == 9
+
+
+def test_coalesced_callers_share_the_error():
+    s = make_scheduler()
+    release = threading.Event()
+
+    def generate():
+        release.wait(5)
+        raise ValueError("bad prompt")
+
+    threads, results = run_concurrently(s, 10, "same prompt", generate)
+    wait_for_calls(s, 10)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(result, ValueError) for result in results)
+    # The failed flight is gone, so the next call tries again
+    assert s.run("same prompt", lambda: "recovered") == "recovered"
+
+
+def test_retryable_errors_are_retried():
+    s = make_scheduler()
+    attempts = []
+
+    def generate():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ServiceUnavailable()
+        return "answer"
+
+    assert s.run("prompt", generate) == "answer"
+    assert len(attempts) == 3
+    assert s.stats['retries'] == 2
+
+
+def test_other_errors_are_not_retried():
+    s = make_scheduler()
+    attempts = []
+
+    def generate():
+        attempts.append(1)
+        raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError):
+        s.run("prompt", generate)
+    assert len(attempts) == 1
+
+
+def test_identical_concurrent_streams_make_one_backend_call():
+    backend = SlowStreamBackend()
+    s = make_scheduler()
+    scheduled = ScheduledBackend(backend, s)
+
+    threads, results = run_concurrently(s, 10, None, None, call=lambda: "".join(scheduled.stream("same prompt")))
+    wait_for_calls(s, 10)
+    backend.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert backend.streams == 1
+    assert results == ["one two three"] * 10
+    assert s.stats['coalesced'] == 9
+
+
+def test_shared_stream_finishes_when_its_first_caller_stops_reading():
+    backend = SlowStreamBackend()
+    s = make_scheduler()
+    scheduled = ScheduledBackend(backend, s)
+    backend.release.set()
+
+    first = scheduled.stream("same prompt")
+    assert next(first) == "one "
+    follower = scheduled.stream("same prompt")
+    assert next(follower) == "one "
+    first.close()
+    assert "".join(follower) == "two three"
+    assert backend.streams == 1
+
+
+def test_zero_rate_limit_means_unlimited():
+    bucket = TokenBucket(requests_per_minute=0, burst=1)
+    bucket.throttled()
+    assert [bucket.acquire() for _ in range(10)] == [0.0] * 10
+    bucket.succeeded()
@@ -0,0 +1,162 @@
+"""
+Tracing of model calls and ingestion steps: bounded in-memory ring buffer, Prometheus and JSON lines export
+"""
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+import config
+
+
+class Span:
+    """Timing and token counts of one traced operation"""
+
+    __slots__ = ('operation', 'kind', 'start', 'duration_s', 'ttft_s', 'prompt_tokens', 'response_tokens',
+                 'cache', 'error', '_started')
+
+    def __init__(self, operation, kind):
+        self.operation = operation
+        self.kind = kind
+        self.start = time.time()
+        self.duration_s = None
+        self.ttft_s = None
+        self.prompt_tokens = None
+        self.response_tokens = None
+        # "hit" or "miss" for operations that can be served from a cache
+        self.cache = None
+        self.error = None
+        self._started = time.perf_counter()
+
+    def first_token(self):
+        """Mark the arrival of the first streamed fragment; non-streamed calls leave ttft_s None"""
+        if self.ttft_s is None:
+            self.ttft_s = time.perf_counter() - self._started
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if not name.startswith('_')}
+
+
+class Tracer:
+    """Keeps the last buffer_size spans plus cumulative per-operation counters
+
+    The ring buffer feeds the dashboard percentiles; the counters and histogram buckets
+    only ever grow, as Prometheus expects. With a jsonl_path every finished span is also
+    appended to that file.
+    """
+
+    def __init__(self, buffer_size=config.TRACE_BUFFER_SIZE, buckets=config.TRACE_BUCKETS,
+                 jsonl_path=config.TRACE_JSONL_PATH):
+        self.buckets = tuple(buckets)
+        self.jsonl_path = jsonl_path
+        self._spans = deque(maxlen=buffer_size)
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, operation, kind="model"):
+        """Trace the enclosed block; exceptions are recorded on the span and re-raised"""
+        span = Span(operation, kind)
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_s = time.perf_counter() - span._started
+            self.record(span)
+
+    def record(self, span):
+        with self._lock:
+            self._spans.append(span)
+            totals = self._totals.get((span.operation, span.kind))
+            if totals is None:
+                totals = self._totals[(span.operation, span.kind)] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0, 'errors': 0,
+                    'cache_hits': 0, 'prompt_tokens': 0, 'response_tokens': 0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if span.duration_s <= bound:
+                    totals['buckets'][i] += 1
+            totals['count'] += 1
+            totals['sum'] += span.duration_s
+            totals['errors'] += span.error is not None
+            totals['cache_hits'] += span.cache == "hit"
+            totals['prompt_tokens'] += span.prompt_tokens or 0
+            totals['response_tokens'] += span.response_tokens or 0
+            if self.jsonl_path:
+                try:
+                    with open(self.jsonl_path, "a") as f:
+                        f.write(json.dumps(span.to_dict()) + "\n")
+                except OSError as e:
+                    print(f"Trace export failed: {e}")
+
+    def spans(self, operation=None):
+        """Buffered spans as dicts, oldest first"""
+        with self._lock:
+            spans = list(self._spans)
+        return [span.to_dict() for span in spans if operation is None or span.operation == operation]
+
+    def summary(self):
+        """Per-operation latency percentiles (ms) and totals over the buffered spans"""
+        groups = {}
+        for span in self.spans():
+            groups.setdefault((span['operation'], span['kind']), []).append(span)
+        rows = []
+        for (operation, kind), spans in sorted(groups.items()):
+            durations = np.array([span['duration_s'] for span in spans]) * 1000
+            ttfts = [span['ttft_s'] * 1000 for span in spans if span['ttft_s'] is not None]
+            cached = [span for span in spans if span['cache'] is not None]
+            p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+            rows.append({
+                'operation': operation,
+                'kind': kind,
+                'count': len(spans),
+                'p50_ms': round(float(p50), 1),
+                'p95_ms': round(float(p95), 1),
+                'p99_ms': round(float(p99), 1),
+                'ttft_p50_ms': round(float(np.percentile(ttfts, 50)), 1) if ttfts else None,
+                'prompt_tokens': sum(span['prompt_tokens'] or 0 for span in spans),
+                'response_tokens': sum(span['response_tokens'] or 0 for span in spans),
+                'cache_hit_rate': sum(span['cache'] == "hit" for span in cached) / len(cached) if cached else None,
+                'errors': sum(span['error'] is not None for span in spans),
+            })
+        return rows
+
+    def prometheus(self):
+        """Cumulative counters in the Prometheus text exposition format"""
+        prefix = "research_assistant"
+        with self._lock:
+            totals = {key: dict(value, buckets=list(value['buckets'])) for key, value in self._totals.items()}
+        lines = [
+            f"# HELP {prefix}_operation_duration_seconds Wall time of model calls and ingestion steps.",
+            f"# TYPE {prefix}_operation_duration_seconds histogram",
+        ]
+        for (operation, kind), value in sorted(totals.items()):
+            labels = f'operation="{operation}",kind="{kind}"'
+            for bound, count in zip(self.buckets, value['buckets']):
+                lines.append(f'{prefix}_operation_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{prefix}_operation_duration_seconds_bucket{{{labels},le="+Inf"}} {value["count"]}')
+            lines.append(f"{prefix}_operation_duration_seconds_sum{{{labels}}} {value['sum']:.6f}")
+            lines.append(f"{prefix}_operation_duration_seconds_count{{{labels}}} {value['count']}")
+        for name, key, help_text in (
+            ("operation_errors_total", 'errors', "Traced operations that raised an error."),
+            ("operation_cache_hits_total", 'cache_hits', "Traced operations served from a cache."),
+            ("prompt_tokens_total", 'prompt_tokens', "Estimated prompt tokens sent to the model."),
+            ("response_tokens_total", 'response_tokens', "Estimated response tokens received from the model."),
+        ):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for (operation, kind), value in sorted(totals.items()):
+                lines.append(f'{prefix}_{name}{{operation="{operation}",kind="{kind}"}} {value[key]}')
+        return "\n".join(lines) + "\n"
+
+    def jsonl(self):
+        """Buffered spans as JSON lines"""
+        return "".join(json.dumps(span) + "\n" for span in self.spans())
+
+
+tracer = Tracer()
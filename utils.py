@@ -1,200 +1,564 @@
-from PyPDF2 import PdfReader
-import google.generativeai as genai
-import os
 import re
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
-import streamlit as st
+
+import config
+from answer_cache import answer_cache
+from backends import get_backend
+from cache import cache_key, response_cache
+from context_budget import budget_context, budget_for, estimate_tokens
+from corpus import corpus
+from documents import Document, content_hash, document_store
+from ingestion import ingest
+from jobs import job_queue
+from metrics import metrics_store
+from question_bank import question_bank
+from retrieval import ChunkIndex, Chunker
+from tracing import tracer
 
 # Load Google API key from multiple sources
 load_dotenv()
 
-# Try to get API key from Streamlit secrets first (for deployment)
-try:
-    google_api_key = st.secrets.get("GOOGLE_API_KEY", None)
-except:
-    google_api_key = None
-
-# Fall back to environment variable if not in secrets
-if not google_api_key:
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-
-# Configure Gemini API with error handling
-try:
-    if google_api_key:
-        genai.configure(api_key=google_api_key)
-        # Initialize Gemini model
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        # Test the connection
-        test_response = model.generate_content("Hello")
-        API_AVAILABLE = True
-    else:
-        API_AVAILABLE = False
-        model = None
-except Exception as e:
-    print(f"Warning: Gemini API not available: {e}")
-    API_AVAILABLE = False
-    model = None
+def api_available():
+    """Cheap status query for the configured model backend"""
+    return get_backend().available()
+
+def __getattr__(name):
+    # Keep `utils.API_AVAILABLE` working for existing callers
+    if name == "API_AVAILABLE":
+        return api_available()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_operation_names = {}
+
+def _operation_name(template):
+    """Trace name of a prompt template: SUMMARY_PROMPT -> 'summary'"""
+    if not _operation_names:
+        for name in dir(config):
+            if name.endswith("_PROMPT"):
+                _operation_names[getattr(config, name)] = name[:-len("_PROMPT")].lower()
+    return _operation_names.get(template, "other")
+
+# Q&A answers are kept per document in the answer cache, which users can clear; a second
+# copy in the response cache would bring cleared answers back
+_ANSWER_TEMPLATES = (config.ANSWER_PROMPT,)
+
+def _response_cached(template):
+    """Should calls with this prompt template go through the response cache?"""
+    return config.CACHE_ENABLED and not (config.ANSWER_CACHE_ENABLED and template in _ANSWER_TEMPLATES)
+
+def _generate(template, document, json_output=False, **params):
+    """Fill a prompt template and return the model's text, served from the response cache when possible"""
+    backend = get_backend()
+    key = cache_key(backend.model_name, template, document, dict(params, json_output=True) if json_output else params)
+    with tracer.span(_operation_name(template)) as span:
+        if _response_cached(template):
+            cached = response_cache.get(key)
+            span.cache = "miss" if cached is None else "hit"
+            if cached is not None:
+                span.response_tokens = estimate_tokens(cached)
+                return cached
+
+        prompt = template.format(document=document, **params)
+        span.prompt_tokens = estimate_tokens(prompt)
+        text = backend.generate(prompt, json_output=json_output)
+        span.response_tokens = estimate_tokens(text)
+    if _response_cached(template):
+        response_cache.set(key, text)
+    return text
+
+def _generate_stream(template, document, **params):
+    """Like _generate, but yield text fragments as the model produces them"""
+    backend = get_backend()
+    key = cache_key(backend.model_name, template, document, params)
+    with tracer.span(_operation_name(template)) as span:
+        if _response_cached(template):
+            cached = response_cache.get(key)
+            span.cache = "miss" if cached is None else "hit"
+            if cached is not None:
+                span.first_token()
+                span.response_tokens = estimate_tokens(cached)
+                yield cached
+                return
+
+        prompt = template.format(document=document, **params)
+        span.prompt_tokens = estimate_tokens(prompt)
+        parts = []
+        for fragment in backend.stream(prompt):
+            span.first_token()
+            parts.append(fragment)
+            yield fragment
+        span.response_tokens = estimate_tokens("".join(parts))
+    if _response_cached(template):
+        response_cache.set(key, "".join(parts))
+
+def load_document(uploaded_file, on_progress=None):
+    """Return the extracted Document for an upload, reusing the copy in the document store
+
+    New uploads are ingested page by page; on_progress, if given, receives an
+    ingestion.Progress after each piece and the chunk index is built alongside. Only
+    these extractions count as processed documents, not reloads of a stored one.
+    """
+    try:
+        data = uploaded_file.getvalue()
+        with tracer.span('load_document', 'ingestion') as span:
+            key = content_hash(data)
+            document = document_store.get(key)
+            span.cache = "miss" if document is None else "hit"
+            if document is None:
+                index = ChunkIndex()
+                # Pages go straight to the document's files instead of being gathered in memory
+                staged = document_store.stage(key)
+                pipeline = ingest(data, uploaded_file.type, key, getattr(uploaded_file, "name", None),
+                                  consumers=[index.feed], directory=staged)
+                with tracer.span('extract', 'ingestion'):
+                    while True:
+                        try:
+                            progress = next(pipeline)
+                        except StopIteration as finished:
+                            document = finished.value
+                            break
+                        if on_progress:
+                            on_progress(progress)
+                # Later questions only look the index up
+                with tracer.span('index', 'ingestion'):
+                    document.chunk_index = index.finish()
+                # The stored copy is memory-mapped from the document's files
+                with tracer.span('store', 'ingestion'):
+                    document = document_store.put(document, staged)
+                metrics_store.increment('documents_processed')
+                # Challenge questions are ready by the time the user asks for them
+                prepare_question_bank(document)
+        return document
+    except Exception as e:
+        return Document(None, f"Failed to read document: {str(e)}")
+
+def _operation_failed(message, strict):
+    """Return an operation's error message, or raise it for strict callers such as background jobs
+
+    Jobs are shared by every session asking for the same analysis, so a failure has to
+    mark the job failed instead of becoming its result.
+    """
+    if strict:
+        raise RuntimeError(message)
+    return message
+
+def as_document(text):
+    """Accept a Document or plain text; strings are wrapped (and their derived data not kept)"""
+    return text if isinstance(text, Document) else Document.from_text(text)
+
+def _chunk_index(document):
+    """The document's BM25 index, built on first use if ingestion did not build it"""
+    if document.chunk_index is None:
+        index = ChunkIndex()
+        for n, page in enumerate(document.pages()):
+            index.feed(page if n == 0 else "\n" + page)
+        index.finish()
+        document.chunk_index = index
+    return document.chunk_index
 
 def process_document(uploaded_file):
     """Extract text from uploaded PDF or TXT file"""
+    return load_document(uploaded_file).text
+
+def generate_summary(text, max_words=150, strict=False):
+    """Summarize the document using Gemini"""
+    if not api_available():
+        return _operation_failed("API not available. Please check your Google API key configuration in Streamlit Cloud secrets.", strict)
+    
     try:
-        text = ""
-        if uploaded_file.type == "application/pdf":
-            reader = PdfReader(uploaded_file)
-            for page in reader.pages:
-                text += page.extract_text() or ""
+        document = as_document(text)
+        
+        if document.tokens > budget_for('summary'):
+            return _map_reduce_summary(_summary_chunks(document), max_words)
         else:
-            text = str(uploaded_file.read(), "utf-8", errors="replace")
-        return text
+            return _generate(config.SUMMARY_PROMPT, document.normalized, max_words=max_words)
     except Exception as e:
-        return f"Failed to read document: {str(e)}"
+        return _operation_failed(f"Summary error: {str(e)}", strict)
 
-def generate_summary(text, max_words=150):
-    """Summarize the document using Gemini"""
-    if not API_AVAILABLE:
-        return "API not available. Please check your Google API key configuration in Streamlit Cloud secrets."
+def _summary_chunks(document):
+    """Split the document into sentence-aligned chunks that each fit the summary budget"""
+    def build():
+        chunker = Chunker(budget_for('summary') * config.CHARS_PER_TOKEN, overlap=0)
+        chunks = []
+        for n, page in enumerate(document.pages()):
+            chunks.extend(chunker.feed(page if n == 0 else "\n" + page))
+        return chunks + chunker.finish()
+    return document.derive('summary_chunks', build, whole_text=True)
+
+def _map_reduce_summary(chunks, max_words):
+    """Summarize every chunk concurrently, then merge the partial summaries into one"""
+    partials = _summarize_chunks(chunks, max_words)
+    if len(partials) == 1:
+        return partials[0]
+    return _generate(config.SUMMARY_REDUCE_PROMPT, "\n\n".join(partials), max_words=max_words)
+
+def _summarize_chunks(chunks, max_words):
+    """Map step: summarize chunks in parallel and reduce until the partials fit in one prompt"""
+    limit = budget_for('summary') * config.CHARS_PER_TOKEN
+    with ThreadPoolExecutor(max_workers=config.SUMMARY_CONCURRENCY) as executor:
+        partials = list(executor.map(
+            lambda chunk: _generate(config.SUMMARY_PROMPT, chunk, max_words=max_words), chunks
+        ))
+
+        # Merge in rounds until the partial summaries fit into a single prompt
+        while len(partials) > 1 and sum(len(p) + 2 for p in partials) > limit:
+            groups = []
+            for partial in partials:
+                if groups and sum(len(p) + 2 for p in groups[-1]) + len(partial) <= limit:
+                    groups[-1].append(partial)
+                else:
+                    groups.append([partial])
+            if len(groups) == len(partials):
+                break
+            partials = list(executor.map(
+                lambda group: _generate(config.SUMMARY_REDUCE_PROMPT, "\n\n".join(group), max_words=max_words),
+                groups
+            ))
+    return partials
+
+def stream_summary(text, max_words=150, strict=False):
+    """Stream the document summary as it is generated"""
+    if not api_available():
+        yield _operation_failed("API not available. Please check your Google API key configuration in Streamlit Cloud secrets.", strict)
+        return
     
     try:
-        text = re.sub(r"\s+", " ", text).strip()
+        document = as_document(text)
         
-        # Split text into chunks if it's too long
-        if len(text) > 30000:  # Gemini has a context limit
-            chunks = [text[i:i+30000] for i in range(0, len(text), 30000)]
-            summaries = []
-            
-            for chunk in chunks[:3]:  # Limit to first 3 chunks
-                prompt = f"Summarize the following text in approximately {max_words} words:\n\n{chunk}"
-                response = model.generate_content(prompt)
-                summaries.append(response.text)
-            
-            return "\n\n".join(summaries)
+        if document.tokens > budget_for('summary'):
+            # The map step has to finish before anything can be shown; only the final merge streams
+            partials = _summarize_chunks(_summary_chunks(document), max_words)
+            if len(partials) == 1:
+                yield partials[0]
+            else:
+                yield from _generate_stream(config.SUMMARY_REDUCE_PROMPT, "\n\n".join(partials), max_words=max_words)
         else:
-            prompt = f"Summarize the following text in approximately {max_words} words:\n\n{text}"
-            response = model.generate_content(prompt)
-            return response.text
+            yield from _generate_stream(config.SUMMARY_PROMPT, document.normalized, max_words=max_words)
     except Exception as e:
-        return f"Summary error: {str(e)}"
+        yield _operation_failed(f"Summary error: {str(e)}", strict)
+
+def _cached_answer(document, question):
+    """Answer to the same or a near-identical question about this document, asked in any session"""
+    if not config.ANSWER_CACHE_ENABLED or document.content_hash is None:
+        return None
+    hit = answer_cache.get(document.content_hash, get_backend().model_name, question)
+    return hit[0] if hit else None
+
+def _store_answer(document, question, answer):
+    if config.ANSWER_CACHE_ENABLED and document.content_hash is not None and answer:
+        answer_cache.set(document.content_hash, get_backend().model_name, question, answer)
+
+def _answer(document, question):
+    """Ask the model, sending only the chunks most relevant to the question"""
+    context = _chunk_index(document).context_for(question, max_tokens=budget_for('answer'))
+    return _generate(config.ANSWER_PROMPT, context, question=question)
+
+def _stream_answer(document, question):
+    """Like _answer, yielding the response as it is generated"""
+    context = _chunk_index(document).context_for(question, max_tokens=budget_for('answer'))
+    yield from _generate_stream(config.ANSWER_PROMPT, context, question=question)
 
 def answer_question(text, question):
     """Use Gemini to answer a question or evaluate an answer"""
-    if not API_AVAILABLE:
+    if not api_available():
         return "API not available. Please check your Google API key configuration in Streamlit Cloud secrets."
     
     try:
-        context = re.sub(r"\s+", " ", text).strip()
+        document = as_document(text)
+        cached = _cached_answer(document, question)
+        if cached is not None:
+            return cached
         
-        # Limit context length to avoid token limits
-        if len(context) > 30000:
-            context = context[:30000]
+        answer = _answer(document, question)
+        _store_answer(document, question, answer)
+        return answer
+    except Exception as e:
+        return f"Answer error: {str(e)}"
+
+def stream_answer(text, question):
+    """Stream the answer to a question as it is generated"""
+    if not api_available():
+        yield "API not available. Please check your Google API key configuration in Streamlit Cloud secrets."
+        return
+    
+    try:
+        document = as_document(text)
+        cached = _cached_answer(document, question)
+        if cached is not None:
+            yield cached
+            return
         
-        prompt = (
-            f"You are a helpful research assistant. Use the following document to answer the question.\n\n"
-            f"Document:\n{context}\n\n"
-            f"Question: {question}\n\n"
-            f"Please provide a clear and accurate answer based on the document content."
+        parts = []
+        for fragment in _stream_answer(document, question):
+            parts.append(fragment)
+            yield fragment
+        _store_answer(document, question, "".join(parts))
+    except Exception as e:
+        yield f"Answer error: {str(e)}"
+
+def add_to_corpus(uploaded_files):
+    """Queue uploads for background ingestion into the document library"""
+    return [corpus.submit(uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type) for uploaded_file in uploaded_files]
+
+def search_corpus(question):
+    """Passages from across the library for a question, within the corpus_answer budget"""
+    passages = []
+    used = 0
+    for passage in corpus.search(question):
+        cost = estimate_tokens(passage['text'])
+        if passages and used + cost > budget_for('corpus_answer'):
+            break
+        passages.append(passage)
+        used += cost
+    return passages
+
+def stream_corpus_answer(question, passages):
+    """Stream an answer from library passages; the model cites them as [1], [2], ..."""
+    if not api_available():
+        yield "API not available. Please check your Google API key configuration in Streamlit Cloud secrets."
+        return
+    if not passages:
+        yield "No passages in the document library match this question."
+        return
+    
+    try:
+        context = "\n\n".join(
+            f"[{n}] {passage['name']}, page {passage['page'] + 1}:\n{passage['text']}"
+            for n, passage in enumerate(passages, 1)
         )
+        yield from _generate_stream(config.CORPUS_ANSWER_PROMPT, context, question=question)
+    except Exception as e:
+        yield f"Answer error: {str(e)}"
+
+def _parse_json(response_text):
+    """Parse a JSON reply, tolerating Markdown code fences around it"""
+    cleaned = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", response_text)
+    return json.loads(cleaned)
 
-        response = model.generate_content(prompt)
-        return response.text
+def _evaluate_answer(text, question, answer):
+    """Grade a single answer; used when the batched reply cannot be parsed"""
+    # Not through the answer cache: near-identical grading prompts differ only in the answer graded
+    try:
+        feedback = _answer(as_document(text), config.EVALUATION_PROMPT.format(question=question, answer=answer))
     except Exception as e:
-        return f"Answer error: {str(e)}"
+        feedback = f"Answer error: {str(e)}"
+    match = re.search(r"(\d+(?:\.\d+)?)\s*/\s*10", feedback)
+    return {'score': float(match.group(1)) if match else None, 'feedback': feedback}
+
+def evaluate_answers(text, questions, answers):
+    """Grade all answered questions in one model call
+
+    Returns one result per question: a dict with 'score' and 'feedback', or None for
+    questions left blank. If the batched reply is not valid JSON, the answers are
+    graded individually in parallel instead.
+    """
+    graded = [i for i, answer in enumerate(answers) if answer.strip()]
+    results = [None] * len(questions)
+    if not graded:
+        return results
+    if not api_available():
+        for i in graded:
+            results[i] = {'score': None, 'feedback': "API not available. Please check your Google API key configuration in Streamlit Cloud secrets."}
+        return results
+    
+    try:
+        context = _chunk_index(as_document(text)).context_for_queries(
+            [questions[i] for i in graded], max_tokens=budget_for('evaluation')
+        )
+        answers_text = "\n\n".join(
+            f"Answer {n}\nQuestion: {questions[i]}\nUser Answer: {answers[i]}" for n, i in enumerate(graded, 1)
+        )
+        parsed = _parse_json(_generate(config.EVALUATION_BATCH_PROMPT, context, json_output=True, answers=answers_text))
+        by_number = {int(item['number']): item for item in parsed}
+        for n, i in enumerate(graded, 1):
+            item = by_number[n]
+            results[i] = {'score': item.get('score'), 'feedback': str(item.get('feedback', ''))}
+        return results
+    except Exception as e:
+        print(f"Batch evaluation failed, grading answers individually: {e}")
+    
+    with ThreadPoolExecutor(max_workers=config.EVALUATION_CONCURRENCY) as executor:
+        for i, result in zip(graded, executor.map(lambda i: _evaluate_answer(text, questions[i], answers[i]), graded)):
+            results[i] = result
+    return results
+
+def _valid_string_list(value, min_items=1):
+    """Return value as a list of non-empty strings if it has at least min_items of them, else None"""
+    if not isinstance(value, list):
+        return None
+    items = [item.strip() for item in value if isinstance(item, str) and item.strip()]
+    return items if len(items) >= min_items else None
+
+def _valid_string(value):
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+def analyze_document(text, max_words=150, num_questions=config.DEFAULT_NUM_QUESTIONS, strict=False):
+    """Summary, key points, insights and questions from a single structured model call
+
+    The JSON reply is validated field by field; a field that is missing or malformed is
+    produced by its individual function instead, so a partly bad reply costs only the
+    calls needed to fill the gaps. Returns a dict with 'summary', 'key_points',
+    'insights' and 'questions'; with strict, a field that cannot be produced raises.
+    """
+    if not api_available():
+        message = _operation_failed("API not available. Please check your Google API key configuration in Streamlit Cloud secrets.", strict)
+        return {'summary': message, 'key_points': [message], 'insights': message,
+                'questions': generate_questions(text, num_questions)}
+    
+    parsed = {}
+    try:
+        context, _ = budget_context(as_document(text), 'analysis')
+        parsed = _parse_json(_generate(
+            config.ANALYSIS_PROMPT, context, json_output=True, max_words=max_words, num_questions=num_questions
+        ))
+        if not isinstance(parsed, dict):
+            parsed = {}
+    except Exception as e:
+        print(f"Structured analysis failed, falling back to individual calls: {e}")
+    
+    validated = {
+        'summary': _valid_string(parsed.get('summary')),
+        'key_points': _valid_string_list(parsed.get('key_points')),
+        'insights': _valid_string(parsed.get('insights')),
+        'questions': _valid_string_list(parsed.get('questions'), num_questions),
+    }
+    fallbacks = {
+        'summary': lambda: generate_summary(text, max_words, strict),
+        'key_points': lambda: extract_key_points(text, strict),
+        'insights': lambda: generate_insights(text, strict),
+        'questions': lambda: generate_questions(text, num_questions),
+    }
+    missing = [field for field, value in validated.items() if value is None]
+    if missing:
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            for field, value in zip(missing, executor.map(lambda field: fallbacks[field](), missing)):
+                validated[field] = value
+    validated['questions'] = validated['questions'][:num_questions]
+    return validated
+
+def _default_questions(num_questions, questions=()):
+    """questions padded with the canned defaults up to num_questions"""
+    padded = list(questions)
+    padded.extend(question for question in config.DEFAULT_QUESTIONS if question not in padded)
+    return padded[:num_questions]
 
 def generate_questions(text, num_questions=3):
     """Generate questions using Gemini"""
-    if not API_AVAILABLE:
-        return [
-            "What is the primary goal of the document?",
-            "What technologies or methods are discussed?",
-            "What are the main findings or recommendations?"
-        ]
+    if not api_available():
+        return _default_questions(num_questions)
     
     try:
-        context = re.sub(r"\s+", " ", text).strip()
+        context, _ = budget_context(as_document(text), 'questions')
         
-        if len(context) > 30000:
-            context = context[:30000]
+        parsed = _parse_json(_generate(config.QUESTION_PROMPT, context, json_output=True, num_questions=num_questions))
+        questions = _valid_string_list(parsed)
         
-        prompt = (
-            f"Based on the following document, generate {num_questions} thoughtful questions that would help someone understand the key concepts and main points.\n\n"
-            f"Document:\n{context}\n\n"
-            f"Generate {num_questions} questions:"
-        )
-        
-        response = model.generate_content(prompt)
-        questions_text = response.text
-        
-        # Extract questions from the response
-        questions = []
-        lines = questions_text.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line and (line.startswith(str(num_questions)) or line.startswith('•') or line.startswith('-') or line.startswith('1.') or line.startswith('2.') or line.startswith('3.')):
-                # Clean up the question
-                question = re.sub(r'^\d+\.\s*', '', line)
-                question = re.sub(r'^[•\-]\s*', '', question)
-                if question and len(question) > 10:
-                    questions.append(question)
-        
-        # If we couldn't parse questions properly, return default ones
-        if len(questions) < num_questions:
-            return [
-                "What is the primary goal or main topic of this document?",
-                "What are the key findings or conclusions presented?",
-                "What methodologies or approaches are discussed in the document?"
-            ]
-        
-        return questions[:num_questions]
+        # If we couldn't parse enough questions, fill up with default ones
+        return _default_questions(num_questions, questions or [])
     except Exception as e:
         # Fallback to static questions if Gemini fails
-        return [
-            "What is the primary goal of the document?",
-            "What technologies or methods are discussed?",
-            "What are the main findings or recommendations?"
-        ]
+        print(f"Question generation failed: {e}")
+        return _default_questions(num_questions)
+
+def _bank_questions(document):
+    """A question pool for the bank: question, reference answer and supporting quote per item"""
+    context, _ = budget_context(document, 'question_bank')
+    parsed = _parse_json(_generate(
+        config.QUESTION_BANK_PROMPT, context, json_output=True, num_questions=config.QUESTION_BANK_SIZE
+    ))
+    items = []
+    for item in parsed if isinstance(parsed, list) else []:
+        question = _valid_string(item.get('question')) if isinstance(item, dict) else None
+        if question:
+            items.append({
+                'question': question,
+                'answer': _valid_string(item.get('answer')) or "",
+                'source': _valid_string(item.get('source')) or "",
+            })
+    return items
+
+def build_question_bank(text):
+    """Generate and store the document's question pool unless it has one"""
+    return question_bank.build(as_document(text), get_backend().model_name, _bank_questions)
+
+def prepare_question_bank(document):
+    """Start building the document's question pool in the background; returns the job, or None"""
+    if not config.QUESTION_BANK_ENABLED or document.content_hash is None or not api_available():
+        return None
+    try:
+        if question_bank_ready(document):
+            return None
+    except Exception as e:
+        print(f"Question bank unavailable: {e}")
+        return None
+    return job_queue.submit(document.content_hash, 'question_bank', build_question_bank, document)
+
+def question_bank_ready(document):
+    return question_bank.ready(document.content_hash, get_backend().model_name)
+
+def challenge_questions(text, num_questions=config.DEFAULT_NUM_QUESTIONS, exclude=()):
+    """Challenge questions as dicts with 'question' and, from the question bank, 'id', 'answer' and 'source'
 
-def extract_key_points(text):
+    Questions are drawn from the document's pool (built first if necessary), skipping
+    the ids in exclude while unseen ones remain; generate_questions fills any gap.
+    """
+    document = as_document(text)
+    items = []
+    if config.QUESTION_BANK_ENABLED and api_available():
+        try:
+            build_question_bank(document)
+            items = question_bank.sample(document.content_hash, get_backend().model_name, num_questions, exclude)
+        except Exception as e:
+            print(f"Question bank unavailable, generating questions directly: {e}")
+    if len(items) < num_questions:
+        asked = [item['question'] for item in items]
+        extra = [question for question in generate_questions(document, num_questions) if question not in asked]
+        items.extend({'question': question} for question in extra[:num_questions - len(items)])
+    return items
+
+def extract_key_points(text, strict=False):
     """Extract key points and insights from the document"""
-    if not API_AVAILABLE:
-        return ["API not available. Please check your Google API key configuration in Streamlit Cloud secrets."]
+    if not api_available():
+        return [_operation_failed("API not available. Please check your Google API key configuration in Streamlit Cloud secrets.", strict)]
     
     try:
-        context = re.sub(r"\s+", " ", text).strip()
-        if len(context) > 30000:
-            context = context[:30000]
-        
-        prompt = (
-            f"Extract 5-7 key points from the following document. Format as a bulleted list:\n\n{context}"
-        )
+        context, _ = budget_context(as_document(text), 'key_points')
         
-        response = model.generate_content(prompt)
-        return response.text.split('\n')
+        return _generate(config.KEY_POINTS_PROMPT, context).split('\n')
     except Exception as e:
-        return [f"Error extracting key points: {str(e)}"]
+        return [_operation_failed(f"Error extracting key points: {str(e)}", strict)]
 
-def generate_insights(text):
+def generate_insights(text, strict=False):
     """Generate insights and analysis from the document"""
-    if not API_AVAILABLE:
-        return "API not available. Please check your Google API key configuration in Streamlit Cloud secrets."
+    if not api_available():
+        return _operation_failed("API not available. Please check your Google API key configuration in Streamlit Cloud secrets.", strict)
     
     try:
-        context = re.sub(r"\s+", " ", text).strip()
-        if len(context) > 30000:
-            context = context[:30000]
+        context, _ = budget_context(as_document(text), 'insights')
         
-        prompt = (
-            f"Analyze the following document and provide 3-4 insights about:\n"
-            f"1. Main themes and patterns\n"
-            f"2. Potential implications\n"
-            f"3. Areas for further research\n\n"
-            f"Document:\n{context}"
-        )
+        return _generate(config.INSIGHTS_PROMPT, context)
+    except Exception as e:
+        return _operation_failed(f"Error generating insights: {str(e)}", strict)
+
+def stream_insights(text, strict=False):
+    """Stream document insights as they are generated"""
+    if not api_available():
+        yield _operation_failed("API not available. Please check your Google API key configuration in Streamlit Cloud secrets.", strict)
+        return
+    
+    try:
+        context, _ = budget_context(as_document(text), 'insights')
         
-        response = model.generate_content(prompt)
-        return response.text
+        yield from _generate_stream(config.INSIGHTS_PROMPT, context)
     except Exception as e:
-        return f"Error generating insights: {str(e)}"
+        yield _operation_failed(f"Error generating insights: {str(e)}", strict)
+
+def context_coverage(text, operation):
+    """How much of the document an operation's prompt covers (see context_budget.fill_budget)"""
+    return budget_context(as_document(text), operation)[1]
 
 def save_session_data(session_data, filename="session_data.json"):
     """Save session data to a JSON file"""